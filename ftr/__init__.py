@@ -3,13 +3,22 @@ from .types import Coord
 from .grid import GridWorld
 from .knowledge import Knowledge
 from .heuristics import manhattan
-from .astar import astar_once, AStarResult
-from .planners import repeated_forward, repeated_backward, adaptive_astar, RunStats
+from .astar import astar_once, AStarResult, AStarEngine, AStarSearch
+from .openlist import BucketOpenList
+from .jps import jps_search
+from .bidir import bidir_search, BidirResult
+from .planners import repeated_forward, repeated_backward, bidirectional, adaptive_astar, dstar_lite, hpa_star, wavefront, RunStats
+from .wavefront import Wavefront
+from .hpa import HPAGraph
+from .instrument import Probe, ReplanRecord
 from .viz import draw_world_png
+from .tracefile import TraceWriter, TraceReader
 
 __all__ = [
     "Coord", "GridWorld", "Knowledge", "manhattan",
-    "astar_once", "AStarResult",
-    "repeated_forward", "repeated_backward", "adaptive_astar", "RunStats",
-    "draw_world_png",
+    "astar_once", "AStarResult", "AStarEngine", "AStarSearch", "BucketOpenList", "jps_search",
+    "bidir_search", "BidirResult",
+    "repeated_forward", "repeated_backward", "bidirectional", "adaptive_astar", "dstar_lite", "hpa_star", "wavefront", "RunStats",
+    "HPAGraph", "Wavefront", "Probe", "ReplanRecord",
+    "draw_world_png", "TraceWriter", "TraceReader",
 ]
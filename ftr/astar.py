@@ -1,17 +1,456 @@
 # ftr/astar.py
 from __future__ import annotations
-from typing import Dict, List, Optional, Set, Tuple
-import heapq
+from array import array
+from typing import TYPE_CHECKING, Dict, List, Optional, Sequence, Set, Union
+import heapq, time
 from .types import Coord
-from .grid import GridWorld
+from .grid import GridWorld, neighbor_table
 from .knowledge import Knowledge
-from .heuristics import manhattan
+from .heuristics import LearnedHeuristic
+from .openlist import OPEN_LISTS
+if TYPE_CHECKING:
+    from .instrument import Probe
 
 class AStarResult:
-    def __init__(self, path: Optional[List[Coord]], expanded: Set[Coord], gvals: Dict[Coord, int]):
-        self.path = path
-        self.expanded = expanded
-        self.gvals = gvals
+    """
+    View over one search. `path`, `expanded` and `gvals` are built from the
+    engine's id lists on first access; gvals covers the expanded (closed) cells.
+    `pushes` and `pops` count open-list operations; pops beyond `expansions`
+    were stale entries for already-closed cells.
+    """
+    def __init__(self, n: int, path_ids: Optional[List[int]], expanded_ids: List[int], g_expanded: List[int],
+                 pushes: int = 0, pops: int = 0):
+        self.n = n
+        self.path_ids = path_ids
+        self.expanded_ids = expanded_ids
+        self.g_expanded = g_expanded
+        self.pushes = pushes
+        self.pops = pops
+        self._path: Optional[List[Coord]] = None
+        self._expanded: Optional[Set[Coord]] = None
+        self._gvals: Optional[Dict[Coord, int]] = None
+
+    @property
+    def path(self) -> Optional[List[Coord]]:
+        if self._path is None and self.path_ids is not None:
+            n = self.n
+            self._path = [divmod(i, n) for i in self.path_ids]
+        return self._path
+
+    @property
+    def expansions(self) -> int:
+        return len(self.expanded_ids)
+
+    @property
+    def expanded(self) -> Set[Coord]:
+        if self._expanded is None:
+            n = self.n
+            self._expanded = {divmod(i, n) for i in self.expanded_ids}
+        return self._expanded
+
+    @property
+    def gvals(self) -> Dict[Coord, int]:
+        if self._gvals is None:
+            n = self.n
+            self._gvals = {divmod(i, n): gv for i, gv in zip(self.expanded_ids, self.g_expanded)}
+        return self._gvals
+
+class AStarEngine:
+    """
+    A* over integer cell ids with preallocated g/parent/closed arrays.
+    Arrays are invalidated between searches by bumping a generation stamp,
+    so one engine can serve every replan on the same world. Only the most
+    recently started search on an engine is valid.
+    """
+    def __init__(self, world: GridWorld):
+        self.n = n = world.n
+        N = n * n
+        self.off, self.ids = neighbor_table(n)
+        # 4-byte buffers: g and parent ids stay below n*n, stamps below 2**32
+        self.g = array("i", [0]) * N
+        self.parent = array("i", [-1]) * N
+        self.seen = array("I", [0]) * N      # stamp: g/parent valid for this generation
+        self.closed = array("I", [0]) * N    # stamp: expanded in this generation
+        self.gen = 0
+        # heap keys pack (f, g-tiebreak, push counter); the counter indexes push_node
+        self._bits = (4 * N + 2).bit_length()
+
+    def _next_gen(self) -> int:
+        self.gen += 1
+        if self.gen >= 0xFFFFFFFF:
+            N = self.n * self.n
+            self.seen = array("I", [0]) * N
+            self.closed = array("I", [0]) * N
+            self.gen = 1
+        return self.gen
+
+    def begin(
+        self,
+        start: int,
+        goal: int,
+        kb: Knowledge,
+        tie_break: str = "larger_g",
+        h_table: Optional[Union[Sequence[int], LearnedHeuristic]] = None,
+        queue: str = "heap",
+    ) -> "AStarSearch":
+        """Start a search that can be advanced in slices with AStarSearch.step."""
+        return AStarSearch(self, start, goal, kb, tie_break, h_table, queue)
+
+    def search(
+        self,
+        start: int,
+        goal: int,
+        kb: Knowledge,
+        tie_break: str = "larger_g",
+        h_table: Optional[Union[Sequence[int], LearnedHeuristic]] = None,
+        queue: str = "heap",
+    ) -> AStarResult:
+        return AStarSearch(self, start, goal, kb, tie_break, h_table, queue).run()
+
+    def detour(self, path: Sequence[int], at: int, kb: Knowledge, bound: int) -> AStarResult:
+        """
+        Local repair: path[at] is the agent's cell and path[at+1] has just
+        turned out to be blocked. Searches from path[at], for at most `bound`
+        expansions, for a way back onto the part of `path` past its last
+        known-blocked cell. Rejoining at path[i] finishes with the remaining
+        len(path)-1-i steps, so A* runs with Manhattan h to the path's end and
+        stops when the cheapest detour-plus-remainder is settled. `path_ids`
+        (from path[at]) is None if nothing was settled within the bound.
+        """
+        bl = kb.blocked
+        n = self.n
+        last = len(path) - 1
+        bad = max(i for i in range(at + 1, last + 1) if bl[path[i]])
+        targets = {path[i]: i for i in range(bad + 1, last + 1)}
+        gr, gc = divmod(path[last], n)
+        gen = self._next_gen()
+        g, parent, seen, closed = self.g, self.parent, self.seen, self.closed
+        off, ids = self.off, self.ids
+        src = path[at]
+        g[src] = 0
+        parent[src] = -1
+        seen[src] = gen
+        sr, sc = divmod(src, n)
+        # keys pack (f, N - g, node + N), the order of (f, -g, node) tuples;
+        # node -1 - t stands for "finish along the path from t"
+        N = n * n
+        B = self._bits
+        mask = (1 << B) - 1
+        heappush, heappop = heapq.heappush, heapq.heappop
+        openh = [((((abs(sr - gr) + abs(sc - gc)) << B) | N) << B) | (src + N)]
+        expanded: List[int] = []
+        g_expanded: List[int] = []
+        join = -1
+        pops = 0
+        while openh and len(expanded) < bound:
+            s = (heappop(openh) & mask) - N
+            pops += 1
+            if s < 0:
+                join = -1 - s
+                break
+            if closed[s] == gen:
+                continue
+            closed[s] = gen
+            gs = g[s]
+            expanded.append(s)
+            g_expanded.append(gs)
+            i = targets.get(s)
+            if i is not None:
+                heappush(openh, ((((gs + last - i) << B) | (N - gs)) << B) | (N - 1 - s))
+            t = gs + 1
+            for j in ids[off[s]:off[s + 1]]:
+                if not bl[j] and (seen[j] != gen or t < g[j]):
+                    seen[j] = gen
+                    g[j] = t
+                    parent[j] = s
+                    jr, jc = divmod(j, n)
+                    heappush(openh, ((((t + abs(jr - gr) + abs(jc - gc)) << B) | (N - t)) << B) | (j + N))
+        pushes = pops + len(openh)
+        if join == -1:
+            return AStarResult(n, None, expanded, g_expanded, pushes, pops)
+        new = [join]
+        p = parent[join]
+        while p != -1:
+            new.append(p)
+            p = parent[p]
+        new.reverse()
+        new.extend(path[targets[join] + 1:])
+        return AStarResult(n, new, expanded, g_expanded, pushes, pops)
+
+class AStarSearch:
+    """
+    One A* search in progress on an AStarEngine. The open list lives here, so
+    `step` can stop after a number of expansions or at a deadline and pick up
+    where it left off. `epoch` is kb.epoch when the search began, letting
+    callers notice knowledge changes and restart. `queue` picks the open
+    list: "heap" is the packed-int heapq below, any other name an
+    openlist.OPEN_LISTS class ("bucket"). All pop in the same order, so
+    results are identical.
+    """
+    def __init__(self, engine: AStarEngine, start: int, goal: int, kb: Knowledge,
+                 tie_break: str = "larger_g", h_table: Optional[Union[Sequence[int], LearnedHeuristic]] = None,
+                 queue: str = "heap"):
+        self.engine = engine
+        self.start = start
+        self.goal = goal
+        self.kb = kb
+        self.epoch = kb.epoch
+        self.larger = tie_break == "larger_g"
+        # a LearnedHeuristic is read inline: learned value if stamped, else Manhattan
+        self.learned = h_table if isinstance(h_table, LearnedHeuristic) else None
+        self.h_table = None if self.learned is not None else h_table
+        self.gen = engine._next_gen()
+        self.result: Optional[AStarResult] = None
+        self.expanded: List[int] = []
+        self.g_expanded: List[int] = []
+
+        n = engine.n
+        gr, gc = divmod(goal, n)
+        if self.h_table is None:
+            sr, sc = divmod(start, n)
+            hs = abs(sr - gr) + abs(sc - gc)
+            if self.learned is not None and self.learned.stamp[start] == self.learned.epoch:
+                hs = self.learned.h[start]
+        else:
+            hs = self.h_table[start]
+        engine.g[start] = 0
+        engine.parent[start] = -1
+        engine.seen[start] = self.gen
+        self.push_node: List[int] = [start]
+        self.openh: List[int] = []
+        self.open = None
+        if queue == "heap":
+            self.openh.append(((hs << engine._bits) | (n * n if self.larger else 0)) << engine._bits)
+        else:
+            if queue not in OPEN_LISTS:
+                raise ValueError(f"unknown queue {queue!r}; choose from heap, {', '.join(OPEN_LISTS)}")
+            self.open = OPEN_LISTS[queue]()
+            self.open.push(hs, n * n if self.larger else 0, start)
+
+    @property
+    def done(self) -> bool:
+        return self.result is not None
+
+    @property
+    def valid(self) -> bool:
+        """False once another search has been started on the same engine."""
+        return self.engine.gen == self.gen
+
+    def run(self) -> AStarResult:
+        self.step()
+        return self.result
+
+    def touched(self, i: int) -> bool:
+        """Whether cell `i` has been generated; a wall found elsewhere is read when it is reached."""
+        return self.engine.seen[i] == self.gen
+
+    def _result(self, path: Optional[List[int]]) -> AStarResult:
+        if self.open is None:
+            pushes, left = len(self.push_node), len(self.openh)
+        else:
+            pushes, left = self.open.pushes, len(self.open)
+        return AStarResult(self.engine.n, path, self.expanded, self.g_expanded, pushes, pushes - left)
+
+    def step(self, max_expansions: Optional[int] = None, deadline: Optional[float] = None) -> bool:
+        """
+        Expand up to `max_expansions` cells, or until time.perf_counter()
+        passes `deadline` (checked every 64 expansions). Returns True once
+        the search has finished; `result` then holds the AStarResult.
+        """
+        if self.result is not None:
+            return True
+        if not self.valid:
+            raise RuntimeError("search was superseded by a newer search on this engine")
+        if self.open is not None:
+            return self._step_open(max_expansions, deadline)
+        eng = self.engine
+        n = eng.n
+        N = n * n
+        gen = self.gen
+        g, parent, seen, closed = eng.g, eng.parent, eng.seen, eng.closed
+        off, ids = eng.off, eng.ids
+        known_blocked = self.kb.blocked
+        larger = self.larger
+        h_table = self.h_table
+        learned = self.learned
+        manhattan = h_table is None and learned is None
+        if learned is not None:
+            lh, lstamp, lep = learned.h, learned.stamp, learned.epoch
+        B = eng._bits
+        mask = (1 << B) - 1
+        push_node = self.push_node
+        add_node = push_node.append
+        pushed = len(push_node)
+        openh = self.openh
+        heappush, heappop = heapq.heappush, heapq.heappop
+        goal = self.goal
+        gr, gc = divmod(goal, n)
+        expanded = self.expanded
+        g_expanded = self.g_expanded
+        add_expanded, add_g = expanded.append, g_expanded.append
+        count = len(expanded)
+
+        stop_at = count + max_expansions if max_expansions is not None else -1
+        while True:
+            if deadline is not None:
+                if time.perf_counter() >= deadline:
+                    return False
+                chunk_end = count + 64
+                if stop_at >= 0:
+                    chunk_end = min(chunk_end, stop_at)
+            else:
+                chunk_end = stop_at
+            while openh:
+                if count == chunk_end:
+                    break
+                s = push_node[heappop(openh) & mask]
+                if closed[s] == gen:
+                    continue
+                closed[s] = gen
+                gs = g[s]
+                add_expanded(s)
+                add_g(gs)
+                count += 1
+
+                if s == goal:
+                    path = [s]
+                    p = parent[s]
+                    while p != -1:
+                        path.append(p)
+                        p = parent[p]
+                    path.reverse()
+                    self.result = self._result(path)
+                    return True
+
+                t = gs + 1
+                gterm = (N - t if larger else t) << B
+                # one neighbor loop per heuristic, so the per-push work has no mode tests
+                if manhattan:
+                    for j in ids[off[s]:off[s + 1]]:
+                        if not known_blocked[j] and (seen[j] != gen or t < g[j]):
+                            seen[j] = gen
+                            g[j] = t
+                            parent[j] = s
+                            jr, jc = divmod(j, n)
+                            heappush(openh, ((((t + abs(jr - gr) + abs(jc - gc)) << B) << B) | gterm) | pushed)
+                            add_node(j)
+                            pushed += 1
+                elif learned is not None:
+                    for j in ids[off[s]:off[s + 1]]:
+                        if not known_blocked[j] and (seen[j] != gen or t < g[j]):
+                            seen[j] = gen
+                            g[j] = t
+                            parent[j] = s
+                            if lstamp[j] == lep:
+                                hj = lh[j]
+                            else:
+                                jr, jc = divmod(j, n)
+                                hj = abs(jr - gr) + abs(jc - gc)
+                            heappush(openh, ((((t + hj) << B) << B) | gterm) | pushed)
+                            add_node(j)
+                            pushed += 1
+                else:
+                    for j in ids[off[s]:off[s + 1]]:
+                        if not known_blocked[j] and (seen[j] != gen or t < g[j]):
+                            seen[j] = gen
+                            g[j] = t
+                            parent[j] = s
+                            heappush(openh, ((((t + h_table[j]) << B) << B) | gterm) | pushed)
+                            add_node(j)
+                            pushed += 1
+            else:
+                self.result = self._result(None)
+                return True
+            if count == stop_at:
+                return False
+
+    def _step_open(self, max_expansions: Optional[int], deadline: Optional[float]) -> bool:
+        # step() on a pluggable open list; same loop with push/pop calls
+        eng = self.engine
+        n = eng.n
+        N = n * n
+        gen = self.gen
+        g, parent, seen, closed = eng.g, eng.parent, eng.seen, eng.closed
+        off, ids = eng.off, eng.ids
+        known_blocked = self.kb.blocked
+        larger = self.larger
+        h_table = self.h_table
+        learned = self.learned
+        if learned is not None:
+            lh, lstamp, lep = learned.h, learned.stamp, learned.epoch
+        openl = self.open
+        push, pop = openl.push, openl.pop
+        goal = self.goal
+        gr, gc = divmod(goal, n)
+        expanded = self.expanded
+        g_expanded = self.g_expanded
+
+        stop_at = len(expanded) + max_expansions if max_expansions is not None else -1
+        while True:
+            if deadline is not None:
+                if time.perf_counter() >= deadline:
+                    return False
+                chunk_end = len(expanded) + 64
+                if stop_at >= 0:
+                    chunk_end = min(chunk_end, stop_at)
+            else:
+                chunk_end = stop_at
+            while openl:
+                if len(expanded) == chunk_end:
+                    break
+                s = pop()
+                if closed[s] == gen:
+                    continue
+                closed[s] = gen
+                gs = g[s]
+                expanded.append(s)
+                g_expanded.append(gs)
+
+                if s == goal:
+                    path = [s]
+                    p = parent[s]
+                    while p != -1:
+                        path.append(p)
+                        p = parent[p]
+                    path.reverse()
+                    self.result = self._result(path)
+                    return True
+
+                t = gs + 1
+                gterm = N - t if larger else t
+                for j in ids[off[s]:off[s + 1]]:
+                    if known_blocked[j]:
+                        continue
+                    if seen[j] != gen or t < g[j]:
+                        seen[j] = gen
+                        g[j] = t
+                        parent[j] = s
+                        if h_table is None:
+                            if learned is not None and lstamp[j] == lep:
+                                hj = lh[j]
+                            else:
+                                jr, jc = divmod(j, n)
+                                hj = abs(jr - gr) + abs(jc - gc)
+                        else:
+                            hj = h_table[j]
+                        push(t + hj, gterm, j)
+            else:
+                self.result = self._result(None)
+                return True
+            if len(expanded) == stop_at:
+                return False
+
+def engine_for(world: GridWorld, slot: int = 0) -> AStarEngine:
+    """
+    Engine cached on the world, so its buffers live as long as the world does.
+    Searches that need two live engines at once use slot 1 for the second.
+    """
+    attr = "_astar_engine" if slot == 0 else f"_astar_engine_{slot}"
+    eng = getattr(world, attr, None)
+    if eng is None or eng.n != world.n:
+        eng = AStarEngine(world)
+        setattr(world, attr, eng)
+    return eng
 
 def astar_once(
     start: Coord,
@@ -19,54 +458,36 @@ def astar_once(
     world: GridWorld,
     kb: Knowledge,
     tie_break: str = "larger_g",          # or "smaller_g"
-    h_table: Optional[List[List[int]]] = None,
+    h_table: Optional[Sequence] = None,   # flat (by cell id) or n x n nested
+    jps: bool = False,                    # Jump Point Search; Manhattan h only
+    bidirectional: bool = False,          # forward + backward frontiers; Manhattan h only
+    queue: str = "heap",                  # plain A* open list: "heap" or an ftr.openlist.OPEN_LISTS name
+    probe: Optional["Probe"] = None,      # instrumentation (ftr.instrument)
 ) -> AStarResult:
     """
     A* over the agent's current knowledge.
     Unknown cells are assumed free; known-blocked are forbidden.
     """
-
-    def h(s: Coord) -> int:
+    if jps or bidirectional:
         if h_table is not None:
-            return h_table[s[0]][s[1]]
-        return manhattan(s, goal)
-
-    openh: List[Tuple[int, int, int, Coord]] = []
-    g: Dict[Coord, int] = {start: 0}
-    parent: Dict[Coord, Coord] = {}
-    closed: Set[Coord] = set()
-    counter = 0
-
-    f0 = g[start] + h(start)
-    gkey = -g[start] if tie_break == "larger_g" else g[start]
-    heapq.heappush(openh, (f0, gkey, counter, start))
-    counter += 1
-
-    while openh:
-        fcur, gk, _, s = heapq.heappop(openh)
-        if s in closed:
-            continue
-        closed.add(s)
-
-        if s == goal:
-            # reconstruct
-            path = [s]
-            while s in parent:
-                s = parent[s]
-                path.append(s)
-            path.reverse()
-            return AStarResult(path, closed, g)
-
-        for nb in world.neighbors(s):
-            if not kb.traversable_for_planning(nb):
-                continue
-            tentative = g[s] + 1
-            if nb not in g or tentative < g[nb]:
-                g[nb] = tentative
-                parent[nb] = s
-                ff = tentative + h(nb)
-                g_term = -tentative if tie_break == "larger_g" else tentative
-                heapq.heappush(openh, (ff, g_term, counter, nb))
-                counter += 1
-
-    return AStarResult(None, closed, g)
+            raise ValueError("jps/bidirectional search does not take an h_table")
+        if jps and bidirectional:
+            raise ValueError("choose one of jps and bidirectional")
+        if queue != "heap":
+            raise ValueError("jps/bidirectional search keeps its own heap; queue applies to plain A*")
+    t0 = time.perf_counter()
+    if jps:
+        from .jps import jps_search
+        res = jps_search(engine_for(world), world.idx(start), world.idx(goal), kb, tie_break=tie_break)
+    elif bidirectional:
+        from .bidir import bidir_search
+        res = bidir_search(engine_for(world), engine_for(world, 1), world.idx(start), world.idx(goal), kb,
+                           tie_break=tie_break)
+    else:
+        if h_table is not None and len(h_table) and isinstance(h_table[0], (list, tuple)):
+            h_table = [v for row in h_table for v in row]
+        res = engine_for(world).search(world.idx(start), world.idx(goal), kb, tie_break=tie_break, h_table=h_table,
+                                       queue=queue)
+    if probe is not None:
+        probe.on_search(res, time.perf_counter() - t0, kb)
+    return res
@@ -0,0 +1,119 @@
+# ftr/bidir.py
+from __future__ import annotations
+from typing import List, Optional
+import heapq
+from .astar import AStarEngine, AStarResult
+from .knowledge import Knowledge
+
+class BidirResult(AStarResult):
+    """
+    AStarResult of a bidirectional search. `expanded_ids` lists the forward
+    expansions followed by the backward ones; `g_expanded` holds each cell's
+    distance from the end its search started at (start or goal).
+    """
+    def __init__(self, n: int, path_ids: Optional[List[int]], expanded_ids: List[int], g_expanded: List[int],
+                 expansions_fwd: int, expansions_bwd: int, pushes: int = 0, pops: int = 0):
+        super().__init__(n, path_ids, expanded_ids, g_expanded, pushes, pops)
+        self.expansions_fwd = expansions_fwd
+        self.expansions_bwd = expansions_bwd
+
+def bidir_search(
+    fwd: AStarEngine,
+    bwd: AStarEngine,
+    start: int,
+    goal: int,
+    kb: Knowledge,
+    tie_break: str = "larger_g",
+) -> BidirResult:
+    """
+    Bidirectional A* over the agent's knowledge: a forward search from
+    `start` (h = Manhattan to goal) on `fwd` and a backward one from `goal`
+    (h = Manhattan to start) on `bwd`. Each step expands the side with the
+    smaller open list. `mu` is the best start-goal cost seen where the two
+    searches touch; once the smallest f on either open list reaches it, no
+    cheaper path is left and the search stops, so paths are optimal.
+    """
+    n = fwd.n
+    N = n * n
+    larger = tie_break == "larger_g"
+    B = fwd._bits
+    mask = (1 << B) - 1
+    heappush, heappop = heapq.heappush, heapq.heappop
+    off, ids = fwd.off, fwd.ids
+    known_blocked = kb.blocked
+
+    # per side: engine, generation, open list, push_node, target (r, c), expanded ids, their g
+    sides = []
+    for eng, root, target in ((fwd, start, goal), (bwd, goal, start)):
+        gen = eng._next_gen()
+        eng.g[root] = 0
+        eng.parent[root] = -1
+        eng.seen[root] = gen
+        rr, rc = divmod(root, n)
+        tr, tc = divmod(target, n)
+        h0 = abs(rr - tr) + abs(rc - tc)
+        sides.append([eng, gen, [((h0 << B) | (N if larger else 0)) << B], [root], (tr, tc), [], []])
+
+    mu = N * 4
+    meet = -1
+    if start == goal:
+        mu, meet = 0, start
+    while True:
+        # drop stale heads so the f bounds below are exact
+        for side in sides:
+            eng, gen, openh, push_node = side[0], side[1], side[2], side[3]
+            while openh and eng.closed[push_node[openh[0] & mask]] == gen:
+                heappop(openh)
+        of, ob = sides[0][2], sides[1][2]
+        if not of or not ob:
+            break
+        if (of[0] >> (2 * B)) >= mu or (ob[0] >> (2 * B)) >= mu:
+            break
+        k = 0 if len(of) <= len(ob) else 1
+        eng, gen, openh, push_node, (tr, tc), expanded, g_expanded = sides[k]
+        other = sides[1 - k][0]
+        ogen = sides[1 - k][1]
+        g, parent, seen, closed = eng.g, eng.parent, eng.seen, eng.closed
+        og, oseen = other.g, other.seen
+
+        s = push_node[heappop(openh) & mask]
+        closed[s] = gen
+        gs = g[s]
+        expanded.append(s)
+        g_expanded.append(gs)
+
+        t = gs + 1
+        gterm = N - t if larger else t
+        for j in ids[off[s]:off[s + 1]]:
+            if known_blocked[j]:
+                continue
+            if seen[j] != gen or t < g[j]:
+                seen[j] = gen
+                g[j] = t
+                parent[j] = s
+                jr, jc = divmod(j, n)
+                hj = abs(jr - tr) + abs(jc - tc)
+                heappush(openh, ((((t + hj) << B) | gterm) << B) | len(push_node))
+                push_node.append(j)
+                if oseen[j] == ogen and t + og[j] < mu:
+                    mu = t + og[j]
+                    meet = j
+
+    fe, be = sides[0][5], sides[1][5]
+    expanded_ids = fe + be
+    g_expanded = sides[0][6] + sides[1][6]
+    pushes = len(sides[0][3]) + len(sides[1][3])
+    pops = pushes - len(sides[0][2]) - len(sides[1][2])
+    if meet == -1:
+        return BidirResult(n, None, expanded_ids, g_expanded, len(fe), len(be), pushes, pops)
+    path: List[int] = []
+    p = meet
+    while p != -1:
+        path.append(p)
+        p = fwd.parent[p]
+    path.reverse()
+    p = bwd.parent[meet]
+    while p != -1:
+        path.append(p)
+        p = bwd.parent[p]
+    return BidirResult(n, path, expanded_ids, g_expanded, len(fe), len(be), pushes, pops)
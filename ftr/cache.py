@@ -0,0 +1,133 @@
+# ftr/cache.py
+from __future__ import annotations
+from dataclasses import fields
+from functools import lru_cache, partial
+from typing import Callable, Dict, Optional
+import hashlib, json, os, shutil, tempfile
+from .planners import RunStats
+
+DEFAULT_CACHE_DIR = ".ftr_cache"
+
+# modules that cannot change a planner's result
+_NOT_PLANNER = ("cli.py", "cache.py", "corpus.py", "pygame_viewer.py")
+
+@lru_cache(maxsize=None)
+def code_version() -> str:
+    """Digest of the package sources planners and PNGs depend on; any edit there invalidates the cache."""
+    pkg = os.path.dirname(os.path.abspath(__file__))
+    h = hashlib.sha1()
+    for name in sorted(os.listdir(pkg)):
+        if name.endswith(".py") and name not in _NOT_PLANNER:
+            h.update(name.encode())
+            with open(os.path.join(pkg, name), "rb") as f:
+                h.update(f.read())
+    return h.hexdigest()[:16]
+
+def planner_id(planner: Callable[..., RunStats]) -> str:
+    """Name plus bound keywords, e.g. "repeated_forward(jps=True)"."""
+    if isinstance(planner, partial):
+        kw = ",".join(f"{k}={v!r}" for k, v in sorted(planner.keywords.items()))
+        return f"{planner_id(planner.func)}({kw})"
+    return getattr(planner, "__qualname__", repr(planner))
+
+def stats_entry(st: RunStats) -> Dict[str, object]:
+    """RunStats without the trajectory and expanded set, as JSON-ready data."""
+    return {f.name: getattr(st, f.name) for f in fields(st) if f.name not in ("path_taken", "expanded_all")}
+
+# RunStats fields that measure the run rather than describe its result
+TIMING_FIELDS = ("elapsed_sec", "plan_sec", "sense_sec", "replan_sec")
+
+def counters_entry(st: RunStats) -> Dict[str, object]:
+    """stats_entry without the timings: what any rerun of the same planner on the same grid reproduces."""
+    return {k: v for k, v in stats_entry(st).items() if k not in TIMING_FIELDS}
+
+def stats_from_entry(d: Dict[str, object]) -> RunStats:
+    """Inverse of stats_entry; a counters_entry comes back with zero timings."""
+    return RunStats(path_taken=[], expanded_all=set(), **{"elapsed_sec": 0.0, **d})
+
+class ResultCache:
+    """
+    Content-addressed store of run results under `root`, one JSON file (plus
+    an optional PNG) per key in two-character fan-out folders. Keys hash the
+    grid's content_hash, the planner identity and tie-break, code_version()
+    and any run parameters, so a changed grid or planner source never hits a
+    stale entry. A hit refreshes the entry's mtime; `evict` then drops the
+    least recently used entries until the folder fits in `max_bytes`.
+    Writes go through a temp file and rename, so concurrent bench workers
+    never see partial entries.
+    """
+    def __init__(self, root: str = DEFAULT_CACHE_DIR, max_bytes: int = 512 << 20):
+        self.root = root
+        self.max_bytes = max_bytes
+
+    def key(self, world_hash: str, planner: Callable[..., RunStats], tie_break: str, **params: object) -> str:
+        blob = json.dumps({"world": world_hash, "planner": planner_id(planner), "tie_break": tie_break,
+                           "code": code_version(), **params}, sort_keys=True)
+        return hashlib.sha1(blob.encode()).hexdigest()
+
+    def _path(self, key: str, ext: str) -> str:
+        return os.path.join(self.root, key[:2], key + ext)
+
+    def get(self, key: str) -> Optional[Dict[str, object]]:
+        path = self._path(key, ".json")
+        try:
+            with open(path) as f:
+                value = json.load(f)
+            os.utime(path)
+        except (OSError, ValueError):
+            return None
+        return value
+
+    def png(self, key: str) -> Optional[str]:
+        """Path of the PNG stored with `key`, if any."""
+        path = self._path(key, ".png")
+        return path if os.path.exists(path) else None
+
+    def put(self, key: str, value: Dict[str, object], png: Optional[str] = None) -> None:
+        os.makedirs(os.path.join(self.root, key[:2]), exist_ok=True)
+        if png is not None and os.path.exists(png):
+            self._atomic(key, ".png", lambda tmp: shutil.copyfile(png, tmp))
+        self._atomic(key, ".json", lambda tmp: _dump(value, tmp))
+
+    def _atomic(self, key: str, ext: str, write: Callable[[str], object]) -> None:
+        fd, tmp = tempfile.mkstemp(dir=os.path.join(self.root, key[:2]), suffix=".tmp")
+        os.close(fd)
+        try:
+            write(tmp)
+            os.replace(tmp, self._path(key, ext))
+        except BaseException:
+            os.unlink(tmp)
+            raise
+
+    def evict(self) -> int:
+        """Delete least recently used entries until the cache fits; returns how many went."""
+        entries = []
+        total = 0
+        for sub in os.listdir(self.root) if os.path.isdir(self.root) else ():
+            folder = os.path.join(self.root, sub)
+            for name in os.listdir(folder):
+                if not name.endswith(".json"):
+                    continue
+                st = os.stat(os.path.join(folder, name))
+                size = st.st_size
+                png = os.path.join(folder, name[:-5] + ".png")
+                if os.path.exists(png):
+                    size += os.path.getsize(png)
+                entries.append((st.st_mtime, size, name[:-5]))
+                total += size
+        removed = 0
+        for _, size, key in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            for ext in (".json", ".png"):
+                try:
+                    os.unlink(self._path(key, ext))
+                except FileNotFoundError:
+                    pass
+            total -= size
+            removed += 1
+        return removed
+
+def _dump(value: Dict[str, object], path: str) -> None:
+    with open(path, "w") as f:
+        json.dump(value, f)
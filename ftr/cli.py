@@ -1,85 +1,767 @@
 # ftr/cli.py
 from __future__ import annotations
-import argparse, csv, os, os.path
-from typing import List, Tuple
+import argparse, cProfile, csv, json, math, os, os.path, pstats, shutil, signal, sys, time, tracemalloc, traceback
+from collections import deque
+from concurrent import futures
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import ExitStack
+from fnmatch import fnmatch
+from functools import partial
+import multiprocessing as mp
+from typing import Callable, Deque, Dict, Iterator, List, Tuple
 
-from .grid import GridWorld
-from .planners import repeated_forward, repeated_backward, adaptive_astar, RunStats
-from .viz import draw_world_png
+from .grid import GridWorld, clear_neighbor_tables
+from .corpus import list_envs, load_env, load_world, write_corpus
+from .planners import repeated_forward, repeated_backward, bidirectional, adaptive_astar, dstar_lite, hpa_star, wavefront, RunStats
+from .wavefront import NUMPY_AVAILABLE
+from .viz import draw_world_png, flush_pngs, plot_loglog, set_png_workers
+from .stats import summarize, regression_test, select_regressions
+from .instrument import Probe
+from .cache import DEFAULT_CACHE_DIR, ResultCache, counters_entry, stats_entry, stats_from_entry
+from .tracefile import TraceWriter, render_trace
 
-def format_stats(name: str, s: RunStats) -> str:
-    return (f"{name:20s} | reached={s.reached!s:5s} | moves={s.moves:4d} | "
+def format_stats(name: str, s: RunStats, timed: bool = True) -> str:
+    line = (f"{name:20s} | reached={s.reached!s:5s} | moves={s.moves:4d} | "
             f"replans={s.replans:3d} | expansions={s.expansions:6d} | "
-            f"time={s.elapsed_sec*1000:7.1f} ms")
+            + (f"time={s.elapsed_sec*1000:7.1f} ms" if timed else "time=   not timed"))
+    if s.expansions_fwd or s.expansions_bwd:
+        line += f" | fwd={s.expansions_fwd} bwd={s.expansions_bwd}"
+    if s.repairs:
+        line += f" | repairs={s.repairs} repair_exp={s.repair_expansions}"
+    return line
 
-def run_all_algs(world: GridWorld, out_dir: str | None = None, base_tag: str = "run") -> List[Tuple[str, RunStats]]:
-    results: List[Tuple[str, RunStats]] = []
-
-    s1 = repeated_forward(world, tie_break="larger_g")
-    results.append(("forward_largerg", s1))
-    if out_dir:
-        draw_world_png(world, s1.path_taken, s1.expanded_all, os.path.join(out_dir, f"{base_tag}_forward_largerg.png"))
+# (name, planner, tie_break) in the order results are reported
+ALGS: List[Tuple[str, Callable[..., RunStats], str]] = [
+    ("forward_largerg", repeated_forward, "larger_g"),
+    ("forward_smallerg", repeated_forward, "smaller_g"),
+    ("backward", repeated_backward, "larger_g"),
+    ("forward_repair", partial(repeated_forward, repair=True), "larger_g"),
+    ("forward_jps", partial(repeated_forward, jps=True), "larger_g"),
+    ("backward_jps", partial(repeated_backward, jps=True), "larger_g"),
+    ("bidirectional", bidirectional, "larger_g"),
+    ("adaptive", adaptive_astar, "larger_g"),
+    ("dstar_lite", dstar_lite, "larger_g"),
+    ("hpa", hpa_star, "larger_g"),
+]
+if NUMPY_AVAILABLE:
+    ALGS.append(("wavefront", wavefront, "larger_g"))
+# entries whose searches run on AStarSearch and so take a `queue`
+QUEUE_ALGS = ("forward_largerg", "forward_smallerg", "backward", "forward_repair", "adaptive")
+# algorithms whose learned heuristic --persist-heuristic keeps on disk
+PERSIST_ALGS = ("adaptive",)
+# suboptimality in bench is measured against this entry's moves
+SUBOPT_REF = "forward_largerg"
+ALG_NAMES = [name for name, _, _ in ALGS]
 
-    s2 = repeated_forward(world, tie_break="smaller_g")
-    results.append(("forward_smallerg", s2))
-    if out_dir:
-        draw_world_png(world, s2.path_taken, s2.expanded_all, os.path.join(out_dir, f"{base_tag}_forward_smallerg.png"))
+def _persisting(name: str, planner: Callable[..., RunStats], persist_dir: str) -> Callable[..., RunStats]:
+    """`planner` with its learned heuristic loaded from and saved to `persist_dir`, if it learns one."""
+    return partial(planner, persist_dir=persist_dir) if persist_dir and name in PERSIST_ALGS else planner
 
-    s3 = repeated_backward(world, tie_break="larger_g")
-    results.append(("backward", s3))
-    if out_dir:
-        draw_world_png(world, s3.path_taken, s3.expanded_all, os.path.join(out_dir, f"{base_tag}_backward.png"))
+def run_alg(world: GridWorld, name: str, out_dir: str | None = None, base_tag: str = "run",
+            lean: bool = False, sample: int = 0, persist_dir: str = "") -> RunStats:
+    """Run one ALGS entry; PNGs need the full trace, so they are skipped when lean."""
+    _, planner, tie_break = ALGS[ALG_NAMES.index(name)]
+    planner = _persisting(name, planner, persist_dir)
+    st = planner(world, tie_break=tie_break, lean=lean, sample=sample)
+    if out_dir and not lean:
+        draw_world_png(world, st.path_taken, st.expanded_all, os.path.join(out_dir, f"{base_tag}_{name}.png"))
+    return st
 
-    s4 = adaptive_astar(world, tie_break="larger_g")
-    results.append(("adaptive", s4))
-    if out_dir:
-        draw_world_png(world, s4.path_taken, s4.expanded_all, os.path.join(out_dir, f"{base_tag}_adaptive.png"))
+def run_all_algs(world: GridWorld, out_dir: str | None = None, base_tag: str = "run") -> List[Tuple[str, RunStats]]:
+    return [(name, run_alg(world, name, out_dir, base_tag)) for name in ALG_NAMES]
 
-    return results
+def _env_tag(spec: str) -> str:
+    # "envs/grid_003.txt" -> "grid_003"; "corpus.ftrc#grid_003" -> "grid_003"
+    path, _, key = spec.partition("#")
+    return os.path.splitext(key or os.path.basename(path))[0]
 
 # -------- subcommands --------
 
+def _gen_unit(task: Tuple[int, int, int, float, int | None, bool]) -> Tuple[str, bytes, int]:
+    """
+    Build grid i; returns (name, binary world, rejected attempts). Attempt k
+    of grid i uses seed + i + k*count, so output depends only on the seed.
+    """
+    i, count, size, p, seed, solvable_only = task
+    k = 0
+    while True:
+        gw = GridWorld.random(n=size, p_blocked=p, seed=(seed + i + k * count) if seed is not None else None)
+        if not solvable_only or gw.solvable():
+            return f"grid_{i:03d}", gw.to_bytes(), k
+        k += 1
+
 def cmd_gen(args: argparse.Namespace) -> None:
-    os.makedirs(args.out, exist_ok=True)
-    for i in range(args.count):
-        gw = GridWorld.random(n=args.size, p_blocked=args.p, seed=(args.seed + i) if args.seed is not None else None)
-        path = os.path.join(args.out, f"grid_{i:03d}.txt")
-        gw.save(path)
-        print("wrote", path)
+    tasks = [(i, args.count, args.size, args.p, args.seed, args.solvable_only) for i in range(args.count)]
+    rejected = 0
+
+    def worlds():
+        nonlocal rejected
+        if args.jobs > 1:
+            with mp.Pool(args.jobs) as pool:
+                results = pool.imap(_gen_unit, tasks)    # in grid order
+                for name, blob, k in results:
+                    rejected += k
+                    yield name, GridWorld.from_bytes(blob)
+        else:
+            for task in tasks:
+                name, blob, k = _gen_unit(task)
+                rejected += k
+                yield name, GridWorld.from_bytes(blob)
+
+    if args.corpus:
+        count = write_corpus(args.corpus, worlds())
+        print(f"wrote {count} grids to", args.corpus)
+    else:
+        os.makedirs(args.out, exist_ok=True)
+        ext = ".ftrb" if args.format == "bin" else ".txt"
+        for name, gw in worlds():
+            path = os.path.join(args.out, name + ext)
+            gw.save(path)
+            print("wrote", path)
+    if args.solvable_only:
+        print(f"rejected {rejected} unsolvable grid(s)")
+
+def cmd_pack(args: argparse.Namespace) -> None:
+    names = list_envs(args.envdir)
+    count = write_corpus(args.out, ((name, load_env(args.envdir, name)) for name in names))
+    print(f"wrote {count} grids to", args.out)
+
+def _refresh(patterns: str, *names: str) -> bool:
+    """True if any comma-separated fnmatch pattern in `patterns` matches one of `names`."""
+    return any(fnmatch(nm, pat) for pat in patterns.split(",") if pat for nm in names)
+
+def _cache_from(args: argparse.Namespace) -> ResultCache | None:
+    return None if args.no_cache else ResultCache(args.cache_dir, args.cache_mb << 20)
 
 def cmd_demo(args: argparse.Namespace) -> None:
-    gw = GridWorld.load(args.env)
+    gw = load_world(args.env)
+    tag = _env_tag(args.env)
     os.makedirs(args.out, exist_ok=True)
-    results = run_all_algs(gw, out_dir=args.out, base_tag=os.path.splitext(os.path.basename(args.env))[0])
-    for name, st in results:
-        print(format_stats(name, st))
+    cache = _cache_from(args)
+    world_hash = gw.content_hash() if cache is not None else ""
+    set_png_workers(args.png_workers)
+    try:
+        for name, planner, tie_break in ALGS:
+            png = os.path.join(args.out, f"{tag}_{name}.png")
+            # a persisted heuristic makes the result depend on earlier runs
+            use_cache = cache is not None and not (args.persist_heuristic and name in PERSIST_ALGS)
+            if use_cache:
+                key = cache.key(world_hash, planner, tie_break, mode="demo")
+                hit = None if _refresh(args.refresh, name, tag) else cache.get(key)
+                if hit is not None and cache.png(key):
+                    shutil.copyfile(cache.png(key), png)
+                    print(format_stats(name, stats_from_entry(hit["stats"])) + " | cached")
+                    continue
+            st = run_alg(gw, name, out_dir=args.out, base_tag=tag, persist_dir=args.persist_heuristic)
+            if use_cache:
+                flush_pngs()
+                cache.put(key, {"stats": stats_entry(st)}, png)
+            print(format_stats(name, st))
+    finally:
+        set_png_workers(0)
+    if cache is not None:
+        cache.evict()
+
+PHASES = ("time", "plan", "move", "sense")
+
+def _bench_row(fname: str, name: str, st: RunStats | None, summary: Dict[str, Dict[str, float]] | None = None,
+               error: str = "") -> Dict[str, object]:
+    def med(phase: str) -> object:
+        return round(summary[phase]["median"], 6) if summary else ""
+    return {
+        "env": fname,
+        "alg": name,
+        "reached": st.reached if st else "",
+        "moves": st.moves if st else "",
+        "replans": st.replans if st else "",
+        "expansions": st.expansions if st else "",
+        "expansions_fwd": st.expansions_fwd if st else "",
+        "expansions_bwd": st.expansions_bwd if st else "",
+        "repairs": st.repairs if st else "",
+        "repair_expansions": st.repair_expansions if st else "",
+        "subopt": "",
+        "time_sec": med("time"),
+        "time_mean": round(summary["time"]["mean"], 6) if summary else "",
+        "time_p95": round(summary["time"]["p95"], 6) if summary else "",
+        "time_std": round(summary["time"]["std"], 6) if summary else "",
+        "plan_sec": med("plan"),
+        "move_sec": med("move"),
+        "sense_sec": med("sense"),
+        "error": error,
+    }
+
+BENCH_FIELDS = list(_bench_row("", "", None).keys())
+
+# RunStats counters a bench record carries, besides env/alg and the timing phases
+_RECORD_FIELDS = ("reached", "moves", "replans", "expansions", "expansions_fwd", "expansions_bwd",
+                  "repairs", "repair_expansions")
+
+def _failed_unit(fname: str, name: str, err: str) -> Tuple[Dict[str, object], Dict | None, str]:
+    return _bench_row(fname, name, None, error=err), None, f"{fname} :: {name:20s} | FAILED {err}"
+
+def _bench_result(fname: str, name: str, st: RunStats, samples: Dict[str, List[float]] | None,
+                  repeat: int) -> Tuple[Dict[str, object], Dict, str]:
+    """Row, record and console line; without `samples` (counters from the cache) the timings stay blank."""
+    if samples is None:
+        record = {"env": fname, "alg": name, **{k: v for k, v in counters_entry(st).items() if k in _RECORD_FIELDS}}
+        return _bench_row(fname, name, st), record, f"{fname} :: {format_stats(name, st, timed=False)}"
+    summary = {ph: summarize(xs) for ph, xs in samples.items()}
+    record = {"env": fname, "alg": name, **{k: getattr(st, k) for k in _RECORD_FIELDS}}
+    for ph in PHASES:
+        record[ph] = dict(summary[ph], samples=samples[ph])
+    line = f"{fname} :: {format_stats(name, st)}"
+    if repeat > 1:
+        t = summary["time"]
+        line += (f" | median={t['median']*1000:.1f} p95={t['p95']*1000:.1f} "
+                 f"std={t['std']*1000:.1f} ms (n={repeat})")
+    return _bench_row(fname, name, st, summary), record, line
+
+def _bench_unit(task: Tuple[str, str, str, str, int, int, bool, str, str, bool, str, str]
+                ) -> Tuple[Dict[str, object], Dict | None, str]:
+    """
+    One (env, algorithm) work unit: `warmup` untimed runs, then `repeat` timed
+    runs; the PNG (if any) is drawn from the last run, outside the timings.
+    Lean units track counters only and draw no PNG. A queue other than
+    "heap" is reported as "<alg>@<queue>". With a cache folder, `reuse`
+    says what a stored result for the same grid content, planner and
+    settings may stand in for: "counters" skips the run and reports its
+    counters untimed, "timings" reuses stored timing samples too (and
+    times the run, storing them, when there are none), and "" times the
+    run afresh, copying only the PNG.
+    `refresh` ignores stored entries.
+    Errors come back as data, not exceptions.
+    """
+    envdir, fname, alg, out, repeat, warmup, lean, queue, cache_dir, refresh, persist_dir, reuse = task
+    name = alg if queue == "heap" else f"{alg}@{queue}"
+    try:
+        gw = load_env(envdir, fname)
+        _, planner, tie_break = ALGS[ALG_NAMES.index(alg)]
+        if queue != "heap":
+            planner = partial(planner, queue=queue)
+        persistent = bool(persist_dir) and alg in PERSIST_ALGS
+        planner = _persisting(alg, planner, persist_dir)
+        png = os.path.join(out, f"{os.path.splitext(fname)[0]}_{name}.png") if out and not lean else None
+        # a persisted heuristic makes the result depend on earlier runs
+        cache = ResultCache(cache_dir) if cache_dir and not persistent else None
+        hit = None
+        if cache is not None:
+            world_hash = gw.content_hash()
+            # deterministic outputs (counters, PNG) vs. timings of one repeat/warmup setting
+            key = cache.key(world_hash, planner, tie_break, lean=lean)
+            tkey = cache.key(world_hash, planner, tie_break, repeat=repeat, warmup=warmup, lean=lean)
+            hit = None if refresh else cache.get(key)
+            if hit is not None and png is not None and not cache.png(key):
+                hit = None
+            if hit is not None and png is not None:
+                shutil.copyfile(cache.png(key), png)
+            timed = cache.get(tkey) if hit is not None and reuse == "timings" else None
+            if timed is not None:
+                row, record, line = _bench_result(fname, name, stats_from_entry(timed["stats"]), timed["samples"], repeat)
+                return row, record, line + " | cached"
+            if hit is not None and reuse == "counters":
+                row, record, line = _bench_result(fname, name, stats_from_entry(hit["stats"]), None, repeat)
+                return row, record, line + " | cached"
+        for _ in range(warmup):
+            planner(gw, tie_break=tie_break, lean=lean)
+        samples: Dict[str, List[float]] = {ph: [] for ph in PHASES}
+        for _ in range(max(1, repeat)):
+            st = planner(gw, tie_break=tie_break, lean=lean)
+            samples["time"].append(st.elapsed_sec)
+            samples["plan"].append(st.plan_sec)
+            samples["move"].append(st.move_sec)
+            samples["sense"].append(st.sense_sec)
+        if png is not None and hit is None:
+            draw_world_png(gw, st.path_taken, st.expanded_all, png)
+        if cache is not None:
+            if hit is None:
+                flush_pngs()     # the PNG must be complete before it is copied in
+                cache.put(key, {"stats": counters_entry(st)}, png)
+            if reuse == "timings":
+                cache.put(tkey, {"stats": stats_entry(st), "samples": samples})
+        row, record, line = _bench_result(fname, name, st, samples, repeat)
+        return row, record, line + (" | cached PNG" if hit is not None else "")
+    except Exception as e:
+        traceback.print_exc()
+        return _failed_unit(fname, name, f"{type(e).__name__}: {e}")
+
+class _BenchTally:
+    """
+    Running summaries for bench: fills each row's `subopt` against the
+    SUBOPT_REF row of the same env (which runs first per env) and keeps
+    per-algorithm aggregates, so nothing grows with the number of rows.
+    `refs` seeds reference moves for envs half-done in a resumed output.
+    """
+    def __init__(self, refs: Dict[str, int] | None = None):
+        self.refs = refs or {}
+        self.env = None
+        self.ref = None
+        self.times: Dict[str, float] = {}                  # alg -> time_sec, current env
+        self.subopt: Dict[str, List[float]] = {}           # alg -> [sum, max, n]
+        self.speedup: Dict[Tuple[str, str], List[float]] = {}  # (queue, alg) -> [sum log ratio, n]
+        self.rows = 0
+        self.failed = 0
+
+    def add(self, row: Dict[str, object]) -> None:
+        self.rows += 1
+        if row["error"]:
+            self.failed += 1
+            return
+        env, alg = row["env"], row["alg"]
+        if env != self.env:
+            self.env, self.ref, self.times = env, self.refs.pop(env, None), {}
+        if alg == SUBOPT_REF and row["reached"] is True:
+            self.ref = row["moves"]
+        if self.ref and row["reached"] is True:
+            row["subopt"] = round(row["moves"] / self.ref, 4)
+            if alg != SUBOPT_REF:
+                agg = self.subopt.setdefault(alg, [0.0, 0.0, 0])
+                agg[0] += row["subopt"]
+                agg[1] = max(agg[1], row["subopt"])
+                agg[2] += 1
+        # queue variants run right after their heap entry, so the heap time is at hand
+        base, _, queue = alg.partition("@")
+        t, tb = row["time_sec"], self.times.get(base)
+        if queue and t and tb:
+            agg = self.speedup.setdefault((queue, base), [0.0, 0])
+            agg[0] += math.log(tb / t)
+            agg[1] += 1
+        self.times[alg] = t
+
+    def report(self) -> None:
+        for alg, (total, worst, k) in self.subopt.items():
+            print(f"suboptimality vs {SUBOPT_REF}: {alg:20s} | mean={total / k:.3f} max={worst:.3f} (n={k})")
+        for (queue, alg), (total, k) in self.speedup.items():
+            print(f"speedup of {queue} over heap: {alg:20s} | x{math.exp(total / k):.3f} geo-mean (n={k})")
+        if self.failed:
+            print(f"{self.failed} of {self.rows} runs failed")
+
+def _trim_partial_line(path: str) -> None:
+    # a run killed mid-write can leave half a line at the end; drop it before appending
+    with open(path, "rb+") as f:
+        f.seek(0, os.SEEK_END)
+        size = f.tell()
+        if size == 0:
+            return
+        f.seek(size - 1)
+        if f.read(1) == b"\n":
+            return
+        f.seek(max(0, size - (1 << 20)))
+        tail = f.read()
+        cut = tail.rfind(b"\n")
+        f.truncate(size - len(tail) + cut + 1 if cut >= 0 else max(0, size - len(tail)))
+
+def _resume_state(path: str, kind: str) -> Tuple[set, Dict[str, int]]:
+    """(env, alg) pairs already in a bench CSV or JSONL output, and the reference moves found there."""
+    done: set = set()
+    refs: Dict[str, int] = {}
+    if not os.path.exists(path):
+        return done, refs
+    _trim_partial_line(path)
+    with open(path, newline="") as f:
+        if kind == "csv":
+            reader = csv.DictReader(f)
+            if reader.fieldnames and reader.fieldnames != BENCH_FIELDS:
+                raise SystemExit(f"{path}: columns differ from this version's bench output; cannot resume")
+            rows = ({**r, "reached": r["reached"] == "True"} for r in reader)
+        else:
+            rows = (json.loads(line) for line in f if line.strip())
+        for r in rows:
+            done.add((r["env"], r["alg"]))
+            if r["alg"] == SUBOPT_REF and r.get("reached") is True and not r.get("error"):
+                refs[r["env"]] = int(r["moves"])
+    return done, refs
+
+def _load_records(path: str) -> List[Dict]:
+    """Bench records from a --json file or a --jsonl stream."""
+    with open(path) as f:
+        if path.endswith(".jsonl"):
+            return [json.loads(line) for line in f if line.strip()]
+        return json.load(f)["results"]
+
+# set in each bench worker: a manager dict units record key -> (pid, start time) in
+_started: Dict[int, Tuple[int, float]] | None = None
+
+def _init_bench_worker(started: Dict[int, Tuple[int, float]]) -> None:
+    global _started
+    _started = started
+
+def _reported_unit(key: int, task: Tuple) -> Tuple[Dict[str, object], Dict | None, str]:
+    # `_started` holds exactly the units running right now
+    _started[key] = (os.getpid(), time.monotonic())
+    try:
+        return _bench_unit(task)
+    finally:
+        _started.pop(key, None)
+
+def _bench_stream(tasks: Iterator[Tuple], args: argparse.Namespace) -> Iterator[Tuple[Dict[str, object], Dict | None, str]]:
+    """
+    Results of `tasks` in task order; with --jobs, at most 4 * jobs units
+    are in flight at once. Each unit's --timeout runs from the moment a
+    worker starts it: past that, the worker is killed. A killed or crashed
+    worker breaks the process pool, so the pool is rebuilt and the units
+    that had not finished are resubmitted (finished ones keep their
+    results); a unit running during two breaks (the likely culprit of an
+    OOM kill or segfault) is reported as failed.
+    """
+    if args.jobs <= 1:
+        set_png_workers(args.png_workers)
+        try:
+            for task in tasks:
+                yield _bench_unit(task)
+        finally:
+            set_png_workers(0)     # waits for queued PNGs
+        return
+    # workers come from a clean server process, never from this (threaded) one;
+    # the manager dict survives a worker killed halfway through an update
+    ctx = mp.get_context("forkserver" if "forkserver" in mp.get_all_start_methods() else None)
+    manager = ctx.Manager()
+    started = manager.dict()      # key -> (worker pid, start time)
+    strikes: Dict[int, int] = {}
+    pool = None
+    # [key, task, future] in task order; results are collected in that order,
+    # so output does not depend on scheduling
+    window: Deque[List] = deque()
+
+    def new_pool() -> ProcessPoolExecutor:
+        return ProcessPoolExecutor(args.jobs, mp_context=ctx, initializer=_init_bench_worker, initargs=(started,))
+
+    def failed(task: Tuple, err: str) -> Tuple[Dict[str, object], Dict | None, str]:
+        return _failed_unit(task[1], task[2] if task[7] == "heap" else f"{task[2]}@{task[7]}", err)
+
+    def rebuild(crashed: bool) -> None:
+        # the pool is broken: units that finished keep their results, the
+        # rest start over on a fresh pool; after a crash, units that were
+        # running when it broke are suspects
+        nonlocal pool
+        pool.shutdown(wait=True, cancel_futures=True)
+        pool = new_pool()
+        for entry in window:
+            key, fut = entry[0], entry[2]
+            if fut.done() and not fut.cancelled() and not isinstance(fut.exception(), BrokenProcessPool):
+                continue
+            if crashed and key in started:
+                strikes[key] = strikes.get(key, 0) + 1
+            started.pop(key, None)
+            entry[2] = pool.submit(_reported_unit, key, entry[1])
+
+    def head() -> Tuple[Dict[str, object], Dict | None, str]:
+        while True:
+            key, task, fut = window[0]
+            if args.timeout:
+                while not fut.done():
+                    run = started.get(key)
+                    if run is not None:
+                        pid, t0 = run
+                        if time.monotonic() - t0 > args.timeout:
+                            window.popleft()
+                            try:
+                                os.kill(pid, getattr(signal, "SIGKILL", signal.SIGTERM))
+                            except OSError:
+                                pass
+                            rebuild(False)
+                            return failed(task, f"timeout after {args.timeout:g}s")
+                    futures.wait([fut], timeout=0.05)
+            try:
+                res = fut.result()
+            except BrokenProcessPool:
+                if strikes.get(key, 0) >= 1:
+                    window.popleft()
+                    rebuild(True)
+                    return failed(task, "worker died (killed or crashed) twice on this unit")
+                rebuild(True)
+                continue
+            except Exception as e:   # e.g. an unpicklable result
+                res = failed(task, f"{type(e).__name__}: {e}")
+            window.popleft()
+            started.pop(key, None)
+            return res
+
+    pool = new_pool()
+    try:
+        for key, task in enumerate(tasks):
+            window.append([key, task, pool.submit(_reported_unit, key, task)])
+            if len(window) >= 4 * args.jobs:
+                yield head()
+        while window:
+            yield head()
+    finally:
+        for proc in list(getattr(pool, "_processes", {}).values()):
+            proc.terminate()    # do not wait out units still running
+        pool.shutdown(wait=True, cancel_futures=True)
+        manager.shutdown()
 
 def cmd_bench(args: argparse.Namespace) -> None:
-    envs = sorted(p for p in os.listdir(args.envdir) if p.endswith(".txt"))
-    os.makedirs(args.out, exist_ok=True)
-    rows = []
-    for fname in envs:
-        fpath = os.path.join(args.envdir, fname)
-        gw = GridWorld.load(fpath)
-        base = os.path.splitext(fname)[0]
-        results = run_all_algs(gw, out_dir=args.out, base_tag=base)
-        for name, st in results:
-            print(f"{fname} :: {format_stats(name, st)}")
-            rows.append({
-                "env": fname,
-                "alg": name,
-                "reached": st.reached,
-                "moves": st.moves,
-                "replans": st.replans,
-                "expansions": st.expansions,
-                "time_sec": round(st.elapsed_sec, 6),
-            })
+    """
+    Streams (env, algorithm) units: grids are loaded one at a time inside
+    the units, and each result is written to --csv / --jsonl / --json as it
+    arrives (flushed every --flush-every rows), so memory stays flat in the
+    corpus size. With --resume, pairs already in the --csv / --jsonl files
+    are skipped and new rows are appended.
+    """
+    if args.resume and not (args.csv or args.jsonl):
+        raise SystemExit("--resume needs --csv or --jsonl to resume from")
+    if args.resume and args.json:
+        raise SystemExit("--json is written as one document and cannot be resumed; use --jsonl")
+    envs = list_envs(args.envdir)
+    if args.out:
+        os.makedirs(args.out, exist_ok=True)
+    queues = [q for q in args.queues.split(",") if q and q != "heap"]
+    cache = _cache_from(args)
+    cache_dir = cache.root if cache is not None else ""
+    # a cached pair is reported from its stored counters, untimed (or with
+    # its stored timings on request), unless the run is a measurement:
+    # --repeat > 1 and --baseline always time every pair afresh
+    measuring = args.repeat > 1 or bool(args.baseline)
+    reuse = "" if measuring else "timings" if args.cache_timings else "counters"
+    if args.cache_timings and measuring:
+        print("--cache-timings ignored: --repeat > 1 and --baseline always time afresh")
+
+    # per output: pairs it already holds (empty unless resuming)
+    done_csv: set = set()
+    done_jsonl: set = set()
+    refs: Dict[str, int] = {}
+    if args.resume:
+        if args.csv:
+            done_csv, refs = _resume_state(args.csv, "csv")
+        if args.jsonl:
+            done_jsonl, more = _resume_state(args.jsonl, "jsonl")
+            refs.update(more)
+    outputs = [d for d, path in ((done_csv, args.csv), (done_jsonl, args.jsonl)) if path]
+    skipped = 0
+
+    def tasks() -> Iterator[Tuple]:
+        nonlocal skipped
+        for fname in envs:
+            for name in ALG_NAMES:
+                for queue in ["heap"] + (queues if name in QUEUE_ALGS else []):
+                    label = name if queue == "heap" else f"{name}@{queue}"
+                    if outputs and all((fname, label) in d for d in outputs):
+                        skipped += 1
+                        continue
+                    yield (args.envdir, fname, name, args.out, args.repeat, args.warmup, args.lean, queue,
+                           cache_dir, _refresh(args.refresh, name, _env_tag(fname), fname), args.persist_heuristic,
+                           reuse)
+
+    baseline = None
+    if args.baseline:
+        baseline = {(r["env"], r["alg"]): r for r in _load_records(args.baseline)}
+    tests = []    # one small tuple per compared pair; corrected together at the end
+    tally = _BenchTally(refs)
+    with ExitStack() as stack:
+        writer = csv_f = jsonl = js = None
+        if args.csv:
+            csv_f = stack.enter_context(open(args.csv, "a" if args.resume else "w", newline=""))
+            writer = csv.DictWriter(csv_f, fieldnames=BENCH_FIELDS)
+            if csv_f.tell() == 0:
+                writer.writeheader()
+        if args.jsonl:
+            jsonl = stack.enter_context(open(args.jsonl, "a" if args.resume else "w"))
+        if args.json:
+            js = stack.enter_context(open(args.json, "w"))
+            js.write(f'{{"repeat": {args.repeat}, "warmup": {args.warmup}, "results": [')
+        files = [f for f in (csv_f, jsonl, js) if f is not None]
+        first = True
+        for k, (row, record, line) in enumerate(_bench_stream(tasks(), args), 1):
+            print(line)
+            tally.add(row)
+            key = (row["env"], row["alg"])
+            if writer is not None and key not in done_csv:
+                writer.writerow(row)
+            if jsonl is not None and key not in done_jsonl:
+                jsonl.write(json.dumps(record if record is not None else
+                                       {"env": row["env"], "alg": row["alg"], "error": row["error"]}) + "\n")
+            if js is not None and record is not None:
+                js.write(("\n" if first else ",\n") + json.dumps(record))
+                first = False
+            if baseline is not None and record is not None and key in baseline:
+                t = regression_test(baseline[key], record, min_pct=args.min_pct, min_abs=args.min_ms / 1000.0)
+                if t is not None:
+                    tests.append(t)
+            if k % args.flush_every == 0:
+                for f in files:
+                    f.flush()
+        if js is not None:
+            js.write("\n]}\n")
+    if skipped:
+        print(f"resumed: skipped {skipped} (env, algorithm) pair(s) already written")
+    if cache is not None:
+        cache.evict()
+    tally.report()
+    for out, label in ((args.csv, "CSV"), (args.jsonl, "JSONL"), (args.json, "JSON")):
+        if out:
+            print(f"wrote {label}:", out)
+    if baseline is not None:
+        regressions = select_regressions(tests, args.alpha)
+        for env, alg, bm, cm, pval in regressions:
+            print(f"REGRESSION {env} :: {alg:20s} | median {bm*1000:.1f} -> {cm*1000:.1f} ms "
+                  f"(+{(cm - bm) / bm * 100:.1f}%, p={pval:.3g})")
+        print(f"{len(regressions)} regression(s) in {len(tests)} compared pair(s) against {args.baseline}")
+        if regressions:
+            raise SystemExit(1)
+
+def cmd_profile(args: argparse.Namespace) -> None:
+    gw = load_world(args.env)
+    _, planner, tie_break = ALGS[ALG_NAMES.index(args.alg)]
+    probe = Probe()
+    prof = cProfile.Profile()
+    prof.enable()
+    st = planner(gw, tie_break=tie_break, lean=True, probe=probe)
+    prof.disable()
+    print(format_stats(args.alg, st))
+    print("counters: " + " ".join(f"{k}={v}" for k, v in st.counters.items()))
+    lat = probe.latency()
+    print(f"replan latency: median={lat['median']*1000:.2f} p95={lat['p95']*1000:.2f} "
+          f"max={max(st.replan_sec, default=0.0)*1000:.2f} ms (n={len(st.replan_sec)}) | "
+          f"plan={st.plan_sec*1000:.1f} sense={st.sense_sec*1000:.1f} move={st.move_sec*1000:.1f} ms")
+    if args.dump:
+        prof.dump_stats(args.dump)
+        print("wrote profile:", args.dump)
+    pstats.Stats(prof).sort_stats(args.sort).print_stats(args.top)
+
+def cmd_trace(args: argparse.Namespace) -> None:
+    gw = load_world(args.env)
+    _, planner, tie_break = ALGS[ALG_NAMES.index(args.alg)]
+    planner = _persisting(args.alg, planner, args.persist_heuristic)
+    out = args.out or os.path.join("runs", f"{_env_tag(args.env)}_{args.alg}.ftrt")
+    # lean: the trace file, not RunStats, holds the trajectory and expanded cells
+    with TraceWriter(out, args.alg) as tw:
+        st = planner(gw, tie_break=tie_break, lean=True, recorder=tw)
+    print(format_stats(args.alg, st))
+    print(f"wrote trace: {out} ({os.path.getsize(out)} bytes, {tw.records} records)")
+
+def cmd_replay(args: argparse.Namespace) -> None:
+    set_png_workers(args.png_workers)
+    try:
+        count = render_trace(args.trace, args.out, args.cell, args.every)
+    finally:
+        set_png_workers(0)
+    print(f"wrote {count} frames to {args.out}")
+
+SCALE_ALGS = "forward_largerg,forward_jps,adaptive,hpa"
+
+def _scale_unit(task: Tuple[int, float, str, int, int, bool, str]) -> Dict[str, object]:
+    """
+    One (n, p, algorithm) configuration: the planner runs lean on `worlds`
+    generated grids (seeds seed, seed+1, ...). Timings come from untraced
+    runs; with memory="tracemalloc" a fresh copy of the first world is run
+    once more under tracemalloc for the peak, with the shared neighbor
+    tables dropped first, so the engine buffers and tables the timed runs
+    left behind are allocated (and counted) again; with "rss" the worker's
+    peak RSS is read (each configuration gets a fresh worker process).
+    """
+    n, p, name, worlds, seed, solvable_only, memory = task
+    rec: Dict[str, object] = {"n": n, "p": p, "alg": name, "worlds": worlds, "error": ""}
+    try:
+        _, planner, tie_break = ALGS[ALG_NAMES.index(name)]
+        gws = []
+        k = 0
+        while len(gws) < worlds:
+            gw = GridWorld.random(n, p, seed=seed + k)
+            k += 1
+            if not solvable_only or gw.solvable():
+                gws.append(gw)
+        times, exps, replans, reached = [], [], [], 0
+        for gw in gws:
+            st = planner(gw, tie_break=tie_break, lean=True)
+            times.append(st.elapsed_sec)
+            exps.append(st.expansions)
+            replans.append(st.replans)
+            reached += st.reached
+        t = summarize(times)
+        eps = [e / s for e, s in zip(exps, times) if s > 0]
+        rec.update(reached=reached, time_median=t["median"], time_p95=t["p95"], time_std=t["std"],
+                   expansions_mean=sum(exps) / len(exps), eps_median=summarize(eps)["median"],
+                   replans_mean=sum(replans) / len(replans), memory=memory, peak_mem_mb="")
+        if memory == "tracemalloc":
+            fresh = GridWorld.from_bytes(gws[0].to_bytes())    # no engine cached on it yet
+            gws = None
+            clear_neighbor_tables()
+            tracemalloc.start()
+            try:
+                planner(fresh, tie_break=tie_break, lean=True)
+                rec["peak_mem_mb"] = tracemalloc.get_traced_memory()[1] / 2 ** 20
+            finally:
+                tracemalloc.stop()
+        elif memory == "rss":
+            import resource    # POSIX only
+            rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            rec["peak_mem_mb"] = rss / 2 ** 20 if sys.platform == "darwin" else rss / 2 ** 10
+    except Exception as e:
+        traceback.print_exc()
+        rec["error"] = f"{type(e).__name__}: {e}"
+    return rec
+
+def _scale_line(rec: Dict[str, object]) -> str:
+    head = f"n={rec['n']:<5} p={rec['p']:<5} :: {rec['alg']:20s}"
+    if rec["error"]:
+        return f"{head} | FAILED {rec['error']}"
+    mem = f" | mem={rec['peak_mem_mb']:.1f} MB" if rec["peak_mem_mb"] != "" else ""
+    return (f"{head} | reached={rec['reached']}/{rec['worlds']} | time={rec['time_median']*1000:9.1f} ms | "
+            f"expansions={rec['expansions_mean']:10.0f} | eps={rec['eps_median']:9.0f}/s | "
+            f"replans={rec['replans_mean']:6.1f}{mem}")
+
+def cmd_bench_scale(args: argparse.Namespace) -> None:
+    sizes = [int(x) for x in args.sizes.split(",")]
+    ps = [float(x) for x in args.p.split(",")]
+    algs = [a for a in args.algs.split(",") if a]
+    for a in algs:
+        if a not in ALG_NAMES:
+            raise SystemExit(f"unknown algorithm {a!r}; choose from {', '.join(ALG_NAMES)}")
+    tasks = [(n, p, a, args.worlds, args.seed, args.solvable_only, args.memory)
+             for n in sizes for p in ps for a in algs]
+    records: List[Dict[str, object]] = []
+    # one fresh worker per configuration keeps peak RSS and caches per configuration
+    pool = mp.Pool(max(1, args.jobs), maxtasksperchild=1)
+    try:
+        pending = [pool.apply_async(_scale_unit, (task,)) for task in tasks]
+        for task, fut in zip(tasks, pending):
+            try:
+                rec = fut.get(timeout=args.timeout or None)
+            except mp.TimeoutError:
+                rec = {"n": task[0], "p": task[1], "alg": task[2], "worlds": task[3],
+                       "error": f"timeout after {args.timeout:g}s"}
+            print(_scale_line(rec))
+            records.append(rec)
+    finally:
+        pool.terminate()
+        pool.join()
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"sizes": sizes, "p": ps, "worlds": args.worlds, "seed": args.seed,
+                       "memory": args.memory, "results": records}, f, indent=1)
+        print("wrote JSON:", args.json)
     if args.csv:
+        fields = ["n", "p", "alg", "worlds", "reached", "time_median", "time_p95", "time_std",
+                  "expansions_mean", "eps_median", "replans_mean", "memory", "peak_mem_mb", "error"]
         with open(args.csv, "w", newline="") as f:
-            writer = csv.DictWriter(f, fieldnames=list(rows[0].keys()))
+            writer = csv.DictWriter(f, fieldnames=fields, restval="")
             writer.writeheader()
-            writer.writerows(rows)
+            writer.writerows(records)
         print("wrote CSV:", args.csv)
+    if args.plot:
+        ok = [r for r in records if not r["error"]]
+        for metric, label, suffix in (("time_median", "median time [s]", "time"),
+                                      ("eps_median", "expansions / s", "eps")):
+            series: Dict[str, List[Tuple[float, float]]] = {}
+            for r in ok:
+                series.setdefault(f"{r['alg']} p={r['p']:g}", []).append((r["n"], r[metric]))
+            out = f"{os.path.splitext(args.plot)[0]}_{suffix}.png"
+            if plot_loglog(series, out, "grid size n", label):
+                print("wrote plot:", out)
+
+def _add_cache_args(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument("--cache-dir", type=str, default=DEFAULT_CACHE_DIR,
+                        help="result cache keyed by grid content, planner, tie-break and planner source")
+    parser.add_argument("--cache-mb", type=int, default=512, help="evict least recently used entries beyond this size")
+    parser.add_argument("--no-cache", action="store_true", help="neither read nor write the result cache")
+    parser.add_argument("--refresh", type=str, default="",
+                        help="recompute (and re-store) entries whose algorithm or env matches these comma-separated globs")
+
+def _add_persist_arg(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument("--persist-heuristic", type=str, default="", metavar="DIR",
+                        help="load and save adaptive A*'s learned heuristic per grid in DIR, so later runs start "
+                             "from it (those runs bypass the result cache)")
 
 def build_argparser() -> argparse.ArgumentParser:
     p = argparse.ArgumentParser(description="Fast Trajectory Replanning (A* variants)")
@@ -91,19 +773,97 @@ def build_argparser() -> argparse.ArgumentParser:
     g.add_argument("--p", type=float, default=0.30)
     g.add_argument("--out", type=str, default="envs")
     g.add_argument("--seed", type=int, default=None)
+    g.add_argument("--format", choices=("txt", "bin"), default="txt", help="one .txt or bit-packed .ftrb file per grid")
+    g.add_argument("--corpus", type=str, default="", help="write all grids into this corpus file instead of --out")
+    g.add_argument("--solvable-only", action="store_true", help="redraw grids until start and goal are connected")
+    g.add_argument("--jobs", type=int, default=1, help="worker processes generating grids")
     g.set_defaults(func=cmd_gen)
 
     d = sub.add_parser("demo", help="run all algorithms on one env and save PNGs")
-    d.add_argument("--env", type=str, required=True)
+    d.add_argument("--env", type=str, required=True, help=".txt/.ftrb file, or corpus.ftrc#name")
     d.add_argument("--out", type=str, default="runs")
+    d.add_argument("--png-workers", type=int, default=0, help="threads encoding/writing PNGs in the background")
+    _add_cache_args(d)
+    _add_persist_arg(d)
     d.set_defaults(func=cmd_demo)
 
-    b = sub.add_parser("bench", help="run all algorithms on every .txt in a folder")
-    b.add_argument("--envdir", type=str, required=True)
-    b.add_argument("--out", type=str, default="runs")
+    b = sub.add_parser("bench", help="run all algorithms on every env in a folder or corpus")
+    b.add_argument("--envdir", type=str, required=True, help="folder of .txt/.ftrb grids, or a corpus file")
+    b.add_argument("--out", type=str, default="runs", help="PNG output folder ('' to skip PNGs)")
     b.add_argument("--csv", type=str, default="")
+    b.add_argument("--jobs", type=int, default=1, help="worker processes for (env, algorithm) units")
+    b.add_argument("--timeout", type=float, default=0.0,
+                   help="with --jobs > 1, kill a unit's worker this many seconds after the unit started (0 = none)")
+    b.add_argument("--png-workers", type=int, default=0,
+                   help="threads encoding/writing PNGs in the background (serial runs; --jobs workers write their own)")
+    b.add_argument("--lean", action="store_true", help="stats-only planners: counters, no trajectories or PNGs")
+    b.add_argument("--repeat", type=int, default=1, help="timed runs per (env, algorithm)")
+    b.add_argument("--warmup", type=int, default=0, help="untimed runs before the timed ones")
+    b.add_argument("--queues", type=str, default="heap",
+                   help="comma-separated A* open lists (heap, bucket); non-heap ones run as <alg>@<queue>")
+    b.add_argument("--json", type=str, default="", help="write per-run summaries and samples as JSON")
+    b.add_argument("--jsonl", type=str, default="", help="stream per-run summaries and samples as JSON lines")
+    b.add_argument("--flush-every", type=int, default=10, help="flush output files every this many rows")
+    b.add_argument("--resume", action="store_true",
+                   help="skip (env, algorithm) pairs already in --csv/--jsonl and append the rest")
+    b.add_argument("--baseline", type=str, default="",
+                   help="--json or --jsonl output of an earlier run; exit 1 on significant regressions")
+    b.add_argument("--alpha", type=float, default=0.05,
+                   help="family-wise significance level for --baseline (Holm-Bonferroni over all compared pairs)")
+    b.add_argument("--min-pct", type=float, default=5.0,
+                   help="minimum effect: ignore median slowdowns below this percentage")
+    b.add_argument("--min-ms", type=float, default=1.0, help="ignore median slowdowns below this many milliseconds")
+    _add_cache_args(b)
+    b.add_argument("--cache-timings", action="store_true",
+                   help="report cached pairs with their stored timings (otherwise they are skipped and left "
+                        "untimed); ignored with --repeat > 1 or --baseline, which time every pair afresh")
+    _add_persist_arg(b)
     b.set_defaults(func=cmd_bench)
 
+    s = sub.add_parser("bench-scale", help="sweep grid size and block probability on generated worlds")
+    s.add_argument("--sizes", type=str, default="51,101,201,401", help="comma-separated grid sizes")
+    s.add_argument("--p", type=str, default="0.1,0.2,0.3", help="comma-separated block probabilities")
+    s.add_argument("--algs", type=str, default=SCALE_ALGS, help="comma-separated algorithm names")
+    s.add_argument("--worlds", type=int, default=3, help="generated worlds per configuration")
+    s.add_argument("--seed", type=int, default=0)
+    s.add_argument("--solvable-only", action="store_true", help="skip worlds where start and goal are disconnected")
+    s.add_argument("--memory", choices=("tracemalloc", "rss", "none"), default="tracemalloc",
+                   help="peak memory: tracemalloc on an extra run, or the worker's peak RSS")
+    s.add_argument("--jobs", type=int, default=1, help="worker processes (one per configuration at a time)")
+    s.add_argument("--timeout", type=float, default=0.0, help="per-configuration timeout in seconds (0 = none)")
+    s.add_argument("--json", type=str, default="")
+    s.add_argument("--csv", type=str, default="")
+    s.add_argument("--plot", type=str, default="", help="write log-log plots to <name>_time.png and <name>_eps.png")
+    s.set_defaults(func=cmd_bench_scale)
+
+    f = sub.add_parser("profile", help="run one algorithm on one env under cProfile with instrumentation")
+    f.add_argument("--env", type=str, required=True, help=".txt/.ftrb file, or corpus.ftrc#name")
+    f.add_argument("--alg", choices=ALG_NAMES, default="forward_largerg")
+    f.add_argument("--top", type=int, default=20, help="hot spots to print")
+    f.add_argument("--sort", choices=("tottime", "cumulative", "ncalls"), default="tottime")
+    f.add_argument("--dump", type=str, default="", help="also write raw cProfile stats to this file")
+    f.set_defaults(func=cmd_profile)
+
+    t = sub.add_parser("trace", help="run one algorithm on one env and stream a replayable binary trace")
+    t.add_argument("--env", type=str, required=True, help=".txt/.ftrb file, or corpus.ftrc#name")
+    t.add_argument("--alg", choices=ALG_NAMES, default="forward_largerg")
+    t.add_argument("--out", type=str, default="", help="trace file (default runs/<env>_<alg>.ftrt)")
+    _add_persist_arg(t)
+    t.set_defaults(func=cmd_trace)
+
+    r = sub.add_parser("replay", help="render a trace as one PNG per proposed path")
+    r.add_argument("--trace", type=str, required=True)
+    r.add_argument("--out", type=str, default="runs/frames")
+    r.add_argument("--cell", type=int, default=10, help="pixels per grid cell")
+    r.add_argument("--every", type=int, default=1, help="draw every this many frames (the last one always)")
+    r.add_argument("--png-workers", type=int, default=0, help="threads encoding/writing PNGs in the background")
+    r.set_defaults(func=cmd_replay)
+
+    k = sub.add_parser("pack", help="convert a folder of grids into one memory-mapped corpus file")
+    k.add_argument("--envdir", type=str, required=True)
+    k.add_argument("--out", type=str, required=True)
+    k.set_defaults(func=cmd_pack)
+
     return p
 
 def main():
@@ -0,0 +1,119 @@
+# ftr/corpus.py
+from __future__ import annotations
+import mmap, os, struct
+from typing import Dict, Iterable, Iterator, List, Tuple, Union
+from .grid import GridWorld
+
+# corpus container:
+#   header  (magic, count, index offset)
+#   records binary GridWorld blobs (GridWorld.to_bytes), back to back
+#   index   per grid: offset, length, name length, utf-8 name
+CORPUS_MAGIC = b"FTRC"
+_HEAD = struct.Struct("<4sIQ")
+_ENTRY = struct.Struct("<QIH")
+
+ENV_EXTS = (".txt", ".ftrb")
+
+class Corpus:
+    """
+    Read-only view of a corpus file through mmap. Opening parses only the
+    index; `corpus[k]` (int or name) decodes just that grid's bytes.
+    """
+    def __init__(self, path: str):
+        self.path = path
+        self._f = open(path, "rb")
+        self._mm = mmap.mmap(self._f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, count, index_off = _HEAD.unpack_from(self._mm, 0)
+        if magic != CORPUS_MAGIC:
+            self.close()
+            raise ValueError(f"{path}: not a grid corpus")
+        self.names: List[str] = []
+        self._spans: List[Tuple[int, int]] = []
+        pos = index_off
+        for _ in range(count):
+            off, length, nlen = _ENTRY.unpack_from(self._mm, pos)
+            pos += _ENTRY.size
+            self.names.append(self._mm[pos:pos + nlen].decode("utf-8"))
+            pos += nlen
+            self._spans.append((off, length))
+        self._by_name: Dict[str, int] = {name: i for i, name in enumerate(self.names)}
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def __getitem__(self, key: Union[int, str]) -> GridWorld:
+        k = self._by_name[key] if isinstance(key, str) else key
+        off, length = self._spans[k]
+        return GridWorld.from_bytes(self._mm[off:off + length])
+
+    def __iter__(self) -> Iterator[GridWorld]:
+        for k in range(len(self)):
+            yield self[k]
+
+    def close(self) -> None:
+        self._mm.close()
+        self._f.close()
+
+    def __enter__(self) -> "Corpus":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+def write_corpus(path: str, items: Iterable[Tuple[str, GridWorld]]) -> int:
+    """Stream (name, world) pairs into a corpus file; returns the grid count."""
+    d = os.path.dirname(path)
+    if d:
+        os.makedirs(d, exist_ok=True)
+    entries: List[Tuple[int, int, bytes]] = []
+    with open(path, "wb") as f:
+        f.write(_HEAD.pack(CORPUS_MAGIC, 0, 0))
+        for name, world in items:
+            blob = world.to_bytes()
+            entries.append((f.tell(), len(blob), name.encode("utf-8")))
+            f.write(blob)
+        index_off = f.tell()
+        for off, length, name in entries:
+            f.write(_ENTRY.pack(off, length, len(name)))
+            f.write(name)
+        f.seek(0)
+        f.write(_HEAD.pack(CORPUS_MAGIC, len(entries), index_off))
+    return len(entries)
+
+# corpora opened by list_envs/load_env, kept for the life of the process
+_OPEN: Dict[str, Corpus] = {}
+
+def is_corpus(path: str) -> bool:
+    if path in _OPEN:
+        return True
+    if not os.path.isfile(path):
+        return False
+    with open(path, "rb") as f:
+        return f.read(len(CORPUS_MAGIC)) == CORPUS_MAGIC
+
+def _open(path: str) -> Corpus:
+    c = _OPEN.get(path)
+    if c is None:
+        c = _OPEN[path] = Corpus(path)
+    return c
+
+def list_envs(src: str) -> List[str]:
+    """Env names in a folder of .txt/.ftrb files or in a corpus file."""
+    if is_corpus(src):
+        return list(_open(src).names)
+    return sorted(p for p in os.listdir(src) if p.endswith(ENV_EXTS))
+
+def load_env(src: str, name: str) -> GridWorld:
+    if is_corpus(src):
+        return _open(src)[name]
+    return GridWorld.load(os.path.join(src, name))
+
+def load_world(spec: str) -> GridWorld:
+    """A .txt/.ftrb file, or `corpus.ftrc#name` / `corpus.ftrc#index` for one corpus entry."""
+    path, _, key = spec.partition("#")
+    if is_corpus(path):
+        c = _open(path)
+        if key in c._by_name:
+            return c[key]
+        return c[int(key or 0)]
+    return GridWorld.load(spec)
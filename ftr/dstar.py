@@ -0,0 +1,129 @@
+# ftr/dstar.py
+from __future__ import annotations
+from array import array
+from typing import Iterable, List
+import heapq
+from .grid import GridWorld, neighbor_table
+from .knowledge import Knowledge
+
+INF = 1 << 60
+
+class DStarLite:
+    """
+    D* Lite (Koenig & Likhachev) over integer cell ids.
+
+    Searches from the goal towards the agent and keeps g/rhs values and the
+    priority queue between calls, so after new blocked cells are reported via
+    `notify_blocked` only the affected vertices are repaired. Edge costs are
+    1, or infinite when either endpoint is known blocked in `kb`.
+    The queue uses lazy deletion: `inq[u]` holds u's current key or -1.
+    """
+    def __init__(self, world: GridWorld, kb: Knowledge, start: int, goal: int):
+        self.n = n = world.n
+        N = n * n
+        self.kb = kb
+        self.off, self.ids = neighbor_table(n)
+        self.goal = goal
+        self.s_start = start
+        self.s_last = start
+        self.km = 0
+        self.g = array("q", [INF]) * N
+        self.rhs = array("q", [INF]) * N
+        self.inq = array("q", [-1]) * N
+        # key = (k1 << B2) | k2 ; heap entry = (key << B) | node
+        self._b = N.bit_length()
+        self._b2 = (N + 1).bit_length()
+        self.U: List[int] = []
+        self.rhs[goal] = 0
+        self._insert(goal)
+
+    def _h(self, a: int, b: int) -> int:
+        ar, ac = divmod(a, self.n)
+        br, bc = divmod(b, self.n)
+        return abs(ar - br) + abs(ac - bc)
+
+    def _key(self, u: int) -> int:
+        m = min(self.g[u], self.rhs[u])
+        return ((m + self._h(self.s_start, u) + self.km) << self._b2) | m
+
+    def _insert(self, u: int) -> None:
+        k = self._key(u)
+        self.inq[u] = k
+        heapq.heappush(self.U, (k << self._b) | u)
+
+    def _update_vertex(self, u: int) -> None:
+        g, rhs = self.g, self.rhs
+        if u != self.goal:
+            if self.kb.blocked[u]:
+                rhs[u] = INF
+            else:
+                blocked = self.kb.blocked
+                best = INF
+                for v in self.ids[self.off[u]:self.off[u + 1]]:
+                    if not blocked[v]:
+                        gv = g[v]
+                        if gv < best:
+                            best = gv
+                rhs[u] = best + 1 if best < INF else INF
+        if g[u] != rhs[u]:
+            self._insert(u)
+        else:
+            self.inq[u] = -1
+
+    def compute(self) -> List[int]:
+        """ComputeShortestPath; returns the ids expanded by this call."""
+        U, inq, g, rhs = self.U, self.inq, self.g, self.rhs
+        off, ids = self.off, self.ids
+        B = self._b
+        mask = (1 << B) - 1
+        start = self.s_start
+        heappop = heapq.heappop
+        expanded: List[int] = []
+        while U:
+            top = U[0]
+            u = top & mask
+            k_old = top >> B
+            if inq[u] != k_old:
+                heappop(U)          # stale entry
+                continue
+            gs, rs = g[start], rhs[start]
+            if rs == gs and gs < INF and k_old >= self._key(start):
+                break
+            heappop(U)
+            k_new = self._key(u)
+            if k_old < k_new:
+                inq[u] = k_new
+                heapq.heappush(U, (k_new << B) | u)
+            elif g[u] > rhs[u]:
+                g[u] = rhs[u]
+                inq[u] = -1
+                expanded.append(u)
+                for s in ids[off[u]:off[u + 1]]:
+                    self._update_vertex(s)
+            else:
+                g[u] = INF
+                expanded.append(u)
+                self._update_vertex(u)
+                for s in ids[off[u]:off[u + 1]]:
+                    self._update_vertex(s)
+        return expanded
+
+    def notify_blocked(self, start: int, cells: Iterable[int]) -> None:
+        """Agent is now at `start`; `cells` became known blocked since the last call."""
+        self.km += self._h(self.s_last, start)
+        self.s_last = start
+        self.s_start = start
+        off, ids = self.off, self.ids
+        for v in cells:
+            self._update_vertex(v)
+            for u in ids[off[v]:off[v + 1]]:
+                self._update_vertex(u)
+
+    def next_step(self, s: int) -> int:
+        """Best successor of s under current g-values, or -1 if the goal is unreachable."""
+        blocked, g = self.kb.blocked, self.g
+        best, best_v = INF, -1
+        for v in self.ids[self.off[s]:self.off[s + 1]]:
+            if not blocked[v] and g[v] < best:
+                best, best_v = g[v], v
+        return best_v
@@ -0,0 +1,83 @@
+# ftr/fov.py
+from __future__ import annotations
+from functools import lru_cache
+from typing import List, Set, Tuple
+from .types import Coord
+from .grid import GridWorld
+
+@lru_cache(maxsize=None)
+def circle_spans(radius: int) -> Tuple[int, ...]:
+    """spans[d] = largest |col| with d*d + col*col <= radius*radius, for d in 0..radius."""
+    r2 = radius * radius
+    spans: List[int] = []
+    col = radius
+    for d in range(radius + 1):
+        while col > 0 and d * d + col * col > r2:
+            col -= 1
+        spans.append(col)
+    return tuple(spans)
+
+class FieldOfView:
+    """
+    Symmetric shadowcasting (after Albert Ford) over a GridWorld, limited to a
+    disc of the given radius. Walls are visible but block sight; cells off the
+    grid block sight. Each quadrant is scanned row by row with exact integer
+    slopes, so a full update is O(r^2).
+
+    `update` keeps the previous visible set and returns only the cells that
+    entered or left view.
+    """
+    # (row, col) of a tile at (depth, col) in each quadrant, relative to the origin
+    QUADRANTS = ((-1, 0, 0, 1), (1, 0, 0, 1), (0, 1, 1, 0), (0, 1, -1, 0))
+
+    def __init__(self, world: GridWorld):
+        self.world = world
+        self.visible: Set[Coord] = set()
+
+    def compute(self, origin: Coord, radius: int) -> Set[Coord]:
+        out: Set[Coord] = {origin}
+        for q in self.QUADRANTS:
+            self._scan(q, origin, radius, out)
+        return out
+
+    def update(self, origin: Coord, radius: int) -> Tuple[Set[Coord], Set[Coord]]:
+        new = self.compute(origin, radius)
+        entered = new - self.visible
+        left = self.visible - new
+        self.visible = new
+        return entered, left
+
+    def reset(self) -> None:
+        self.visible = set()
+
+    def _scan(self, q: Tuple[int, int, int, int], origin: Coord, radius: int, out: Set[Coord]) -> None:
+        n = self.world.n
+        cells = self.world.cells
+        spans = circle_spans(radius)
+        dr_d, dr_c, dc_d, dc_c = q
+        orow, ocol = origin
+        # rows to scan: depth and start/end slopes as (num, den), den > 0
+        stack = [(1, -1, 1, 1, 1)]
+        while stack:
+            depth, sn, sd, en, ed = stack.pop()
+            if depth > radius:
+                continue
+            span = spans[depth]
+            min_col = (2 * depth * sn + sd) // (2 * sd)          # round half up
+            max_col = -((ed - 2 * depth * en) // (2 * ed))       # round half down
+            prev_wall = None
+            for col in range(min_col, max_col + 1):
+                r = orow + dr_d * depth + dr_c * col
+                c = ocol + dc_d * depth + dc_c * col
+                inside = 0 <= r < n and 0 <= c < n
+                wall = not inside or cells[r * n + c] == 1
+                if inside and -span <= col <= span and (
+                        wall or (col * sd >= depth * sn and col * ed <= depth * en)):
+                    out.add((r, c))
+                if prev_wall and not wall:
+                    sn, sd = 2 * col - 1, 2 * depth
+                elif prev_wall is False and wall:
+                    stack.append((depth + 1, sn, sd, 2 * col - 1, 2 * depth))
+                prev_wall = wall
+            if prev_wall is False:
+                stack.append((depth + 1, sn, sd, en, ed))
@@ -1,60 +1,280 @@
 # ftr/grid.py
 from __future__ import annotations
+from array import array
+from bisect import bisect_right
 from dataclasses import dataclass
-from typing import List, Optional
-import random, os
+from functools import lru_cache
+from typing import Dict, List, Optional, Sequence, Tuple
+import hashlib, random, os, re, struct
 from .types import Coord
 
+# byte translation tables between the '0'/'1' text rows and the 0/1 cell buffer
+_TXT_TO_CELL = bytes(1 if b == ord("1") else 0 for b in range(256))
+_CELL_TO_TXT = bytes(ord("1") if b else ord("0") for b in range(256))
+
+# maximal runs of free cells within a row
+_FREE_RUN = re.compile(b"\x00+")
+
+@lru_cache(maxsize=None)
+def _below(th: int) -> bytes:
+    """Translate table mapping bytes < th to 1 (blocked) and the rest to 0."""
+    return bytes(1 if b < th else 0 for b in range(256))
+
+# binary world: header (magic, n, start, goal) followed by n*n cells, one bit
+# each, row-major, most significant bit first, zero-padded to a whole byte
+GRID_MAGIC = b"FTRG"
+_GRID_HDR = struct.Struct("<4sIIIII")
+
+def pack_bits(cells: bytes) -> bytes:
+    """0/1 byte per cell -> bit-packed bytes (MSB first)."""
+    nbytes = (len(cells) + 7) // 8
+    if not cells:
+        return b""
+    bits = cells.translate(_CELL_TO_TXT) + b"0" * (nbytes * 8 - len(cells))
+    return int(bits, 2).to_bytes(nbytes, "big")
+
+def unpack_bits(data: bytes, count: int) -> bytearray:
+    """Inverse of pack_bits for the first `count` cells."""
+    if count == 0:
+        return bytearray()
+    bits = format(int.from_bytes(data, "big"), f"0{len(data) * 8}b")[:count]
+    return bytearray(bits.encode("ascii").translate(_TXT_TO_CELL))
+
+def rect_neighbor_table(h: int, w: int) -> Tuple[array, array]:
+    """
+    CSR-style 4-neighborhood for an h x w grid, indexed by cell id r*w+c.
+    Neighbors of cell i are ids[off[i]:off[i+1]], in up/down/left/right order.
+    Both tables are 4-byte arrays filled row by row with strided slice
+    assignments, so building one costs O(h) Python steps, not O(h*w).
+    """
+    off = array("i", bytes(4 * (h * w + 1)))
+    if w < 2 and h < 2:
+        return off, array("i")
+    total = 2 * (h * (w - 1) + w * (h - 1))
+    ids = array("i", bytes(4 * total))
+    seq = array("i", range(h * w))      # neighbor ids are runs of consecutive ids: copy slices of this
+    base = 0
+    for r in range(h):
+        i = r * w
+        vert = []           # vertical neighbor offsets present in this row
+        if r > 0:
+            vert.append(-w)
+        if r < h - 1:
+            vert.append(w)
+        k = len(vert)
+        if w == 1:
+            ids[base:base + k] = array("i", [i + dv for dv in vert])
+            off[i + 1] = base = base + k
+            continue
+        d = k + 2           # entries per cell strictly inside the row
+        # cell 0 (no left neighbor), then cells 1..w-2 at stride d, then cell w-1
+        ids[base:base + k + 1] = array("i", [i + dv for dv in vert] + [i + 1])
+        first = base + k + 1
+        m = w - 2
+        if m:
+            for j, dv in enumerate(vert + [-1, 1]):
+                ids[first + j:first + j + m * d:d] = seq[i + 1 + dv:i + 1 + dv + m]
+        last = first + m * d
+        ids[last:last + k + 1] = array("i", [i + w - 1 + dv for dv in vert] + [i + w - 2])
+        off[i + 1:i + w] = array("i", range(first, last + 1, d))
+        off[i + w] = base = last + k + 1
+    return off, ids
+
+# CSR neighbor tables depend only on n, so worlds of the same size share one
+_NEIGHBOR_CACHE: Dict[int, Tuple[array, array]] = {}
+
+def neighbor_table(n: int) -> Tuple[array, array]:
+    """rect_neighbor_table(n, n), cached per n."""
+    tbl = _NEIGHBOR_CACHE.get(n)
+    if tbl is None:
+        tbl = _NEIGHBOR_CACHE[n] = rect_neighbor_table(n, n)
+    return tbl
+
+def clear_neighbor_tables() -> None:
+    """Drop the cached tables, e.g. so a memory measurement sees them built."""
+    _NEIGHBOR_CACHE.clear()
+
 @dataclass
 class GridWorld:
     n: int
-    blocked: List[List[bool]]  # True=blocked
+    cells: bytearray  # flat, indexed by r*n+c; 1=blocked
     start: Coord
     goal: Coord
 
+    def __post_init__(self) -> None:
+        # accept the legacy List[List[bool]] layout as well as a flat buffer
+        if not isinstance(self.cells, (bytes, bytearray)):
+            self.cells = bytearray(1 if b else 0 for row in self.cells for b in row)
+        elif isinstance(self.cells, bytes):
+            self.cells = bytearray(self.cells)
+        if len(self.cells) != self.n * self.n:
+            raise ValueError(f"expected {self.n * self.n} cells, got {len(self.cells)}")
+        self._rows: Optional[List[memoryview]] = None
+
+    def __getstate__(self) -> Dict[str, object]:
+        # the cached row views of `blocked` cannot be pickled; rebuild them on demand
+        state = self.__dict__.copy()
+        state["_rows"] = None
+        return state
+
     @staticmethod
     def random(n: int = 51, p_blocked: float = 0.30, seed: Optional[int] = None) -> "GridWorld":
-        if seed is not None:
-            random.seed(seed)
-        blocked = [[random.random() < p_blocked for _ in range(n)] for _ in range(n)]
+        """
+        Block each cell independently with probability p_blocked (start and
+        goal stay free). Uses its own random.Random(seed), never the global
+        state, so the same seed always yields the same world and parallel
+        workers do not interfere. All cells come from one randbytes() draw:
+        bytes below floor(256p) block, bytes equal to it block with the
+        remaining fraction.
+        """
+        rng = random.Random(seed)
+        x = min(max(p_blocked, 0.0), 1.0) * 256
+        th = int(x)
+        frac = x - th
+        raw = rng.randbytes(n * n)
+        cells = bytearray(raw.translate(_below(th)))
+        if frac and th < 256:
+            i = raw.find(th)
+            while i != -1:
+                if rng.random() < frac:
+                    cells[i] = 1
+                i = raw.find(th, i + 1)
         start, goal = (0, 0), (n - 1, n - 1)
-        blocked[start[0]][start[1]] = False
-        blocked[goal[0]][goal[1]] = False
-        return GridWorld(n, blocked, start, goal)
+        cells[start[0] * n + start[1]] = 0
+        cells[goal[0] * n + goal[1]] = 0
+        return GridWorld(n, cells, start, goal)
+
+    @staticmethod
+    def from_bytes(buf: bytes) -> "GridWorld":
+        """Parse the binary format; `buf` may be a memoryview into a larger file."""
+        magic, n, sr, sc, gr, gc = _GRID_HDR.unpack_from(buf, 0)
+        if magic != GRID_MAGIC:
+            raise ValueError("not a binary grid")
+        off = _GRID_HDR.size
+        cells = unpack_bits(buf[off:off + (n * n + 7) // 8], n * n)
+        return GridWorld(n, cells, (sr, sc), (gr, gc))
+
+    def to_bytes(self) -> bytes:
+        return _GRID_HDR.pack(GRID_MAGIC, self.n, *self.start, *self.goal) + pack_bits(self.cells)
 
     @staticmethod
     def load(path: str) -> "GridWorld":
-        with open(path, "r") as f:
-            lines = [line.strip() for line in f if line.strip()]
+        with open(path, "rb") as f:
+            data = f.read()
+        if data[:len(GRID_MAGIC)] == GRID_MAGIC:
+            return GridWorld.from_bytes(data)
+        lines = [line.strip() for line in data.splitlines() if line.strip()]
 
         header = lines[0].split()
-        if header and header[0] == "GRID" and len(header) == 6:
+        if header and header[0] == b"GRID" and len(header) == 6:
             n = int(header[1])
             sr, sc, gr, gc = map(int, header[2:])
-            arr = [[c == "1" for c in lines[i + 1]] for i in range(n)]
-            return GridWorld(n, arr, (sr, sc), (gr, gc))
+            cells = bytearray().join(lines[i + 1].translate(_TXT_TO_CELL) for i in range(n))
+            return GridWorld(n, cells, (sr, sc), (gr, gc))
 
         # fallback (legacy flat format: lines of 0/1; start=(0,0), goal=(n-1,n-1))
-        arr = [[c == "1" for c in row] for row in lines]
-        n = len(arr)
-        return GridWorld(n, arr, (0, 0), (n - 1, n - 1))
+        n = len(lines)
+        cells = bytearray().join(row.translate(_TXT_TO_CELL) for row in lines)
+        return GridWorld(n, cells, (0, 0), (n - 1, n - 1))
 
     def save(self, path: str) -> None:
+        """Text format, or the bit-packed binary format for `.ftrb` paths."""
         os.makedirs(os.path.dirname(path), exist_ok=True)
-        with open(path, "w") as f:
-            f.write(f"GRID {self.n} {self.start[0]} {self.start[1]} {self.goal[0]} {self.goal[1]}\n")
-            for r in range(self.n):
-                f.write("".join("1" if self.blocked[r][c] else "0" for c in range(self.n)) + "\n")
+        if path.endswith(".ftrb"):
+            with open(path, "wb") as f:
+                f.write(self.to_bytes())
+            return
+        n = self.n
+        with open(path, "wb") as f:
+            f.write(f"GRID {n} {self.start[0]} {self.start[1]} {self.goal[0]} {self.goal[1]}\n".encode())
+            txt = self.cells.translate(_CELL_TO_TXT)
+            for r in range(n):
+                f.write(txt[r * n:(r + 1) * n] + b"\n")
+
+    def content_hash(self) -> str:
+        """Stable digest of size, start, goal and cells."""
+        h = hashlib.sha1(_GRID_HDR.pack(GRID_MAGIC, self.n, *self.start, *self.goal))
+        h.update(self.cells)
+        return h.hexdigest()
+
+    @property
+    def blocked(self) -> Sequence[memoryview]:
+        """Row views over `cells`, so `blocked[r][c]` keeps working (truthy when blocked)."""
+        if self._rows is None:
+            mv = memoryview(self.cells)
+            n = self.n
+            self._rows = [mv[r * n:(r + 1) * n] for r in range(n)]
+        return self._rows
+
+    # ----- connectivity -----
+    def connected(self, a: Coord, b: Coord) -> bool:
+        """
+        True if free cells a and b are 4-connected in the true world. Searches
+        over horizontal runs of free cells (found with a regex per row)
+        instead of single cells.
+        """
+        n, cells = self.n, self.cells
+        if cells[a[0] * n + a[1]] or cells[b[0] * n + b[1]]:
+            return False
+        runs = [[(m.start() - r * n, m.end() - r * n) for m in _FREE_RUN.finditer(cells, r * n, (r + 1) * n)]
+                for r in range(n)]
+        starts = [[s for s, _ in row] for row in runs]
+
+        def run_of(r: int, c: int) -> int:
+            return bisect_right(starts[r], c) - 1
 
+        target = (b[0], run_of(*b))
+        first = (a[0], run_of(*a))
+        seen = {first}
+        stack = [first]
+        while stack:
+            r, k = stack.pop()
+            if (r, k) == target:
+                return True
+            s0, e0 = runs[r][k]
+            for rr in (r - 1, r + 1):
+                if 0 <= rr < n:
+                    row, st = runs[rr], starts[rr]
+                    j = max(bisect_right(st, s0) - 1, 0)
+                    while j < len(row) and row[j][0] < e0:
+                        if row[j][1] > s0 and (rr, j) not in seen:
+                            seen.add((rr, j))
+                            stack.append((rr, j))
+                        j += 1
+        return False
+
+    def solvable(self) -> bool:
+        return self.connected(self.start, self.goal)
+
+    # ----- integer cell ids -----
+    def idx(self, s: Coord) -> int:
+        return s[0] * self.n + s[1]
+
+    def coord(self, i: int) -> Coord:
+        return divmod(i, self.n)
+
+    def neighbor_ids(self, i: int) -> array:
+        off, ids = neighbor_table(self.n)
+        return ids[off[i]:off[i + 1]]
+
+    # ----- coordinate API -----
     def in_bounds(self, s: Coord) -> bool:
         r, c = s
         return 0 <= r < self.n and 0 <= c < self.n
 
     def is_blocked(self, s: Coord) -> bool:
-        r, c = s
-        return self.blocked[r][c]
+        return self.cells[s[0] * self.n + s[1]] == 1
 
-    def neighbors(self, s: Coord):
+    def neighbors(self, s: Coord) -> List[Coord]:
         r, c = s
-        cand = [(r - 1, c), (r + 1, c), (r, c - 1), (r, c + 1)]
-        return [p for p in cand if self.in_bounds(p)]
+        n = self.n
+        out = []
+        if r > 0:
+            out.append((r - 1, c))
+        if r < n - 1:
+            out.append((r + 1, c))
+        if c > 0:
+            out.append((r, c - 1))
+        if c < n - 1:
+            out.append((r, c + 1))
+        return out
@@ -1,5 +1,113 @@
 # ftr/heuristics.py
+from __future__ import annotations
+from array import array
+from collections import OrderedDict
+from typing import Optional, Sequence, Set
+import os, struct, tempfile
 from .types import Coord
 
 def manhattan(a: Coord, b: Coord) -> int:
     return abs(a[0] - b[0]) + abs(a[1] - b[1])
+
+class LearnedHeuristic:
+    """
+    Adaptive A* heuristic towards a fixed goal, by cell id. A learned value
+    h[i] is valid only where stamp[i] == epoch; every other cell falls back to
+    Manhattan distance, computed on demand, so nothing is filled up front and
+    `reset()` forgets everything in O(1).
+
+    Learned values are g(goal) - g(s) from searches under the agent's
+    knowledge, so they stay admissible for the true world. They are only
+    consistent with a map that knows at least the walls they were learned
+    with, so those are kept in `walls` for a later run to start from.
+    """
+    def __init__(self, n: int, goal: int):
+        self.n = n
+        self.goal = goal
+        self.h = array("l", [0]) * (n * n)
+        self.stamp = array("L", [0]) * (n * n)
+        self.epoch = 1
+        self.walls: Set[int] = set()
+
+    def reset(self) -> None:
+        self.epoch += 1
+        self.walls = set()
+
+    def __getitem__(self, i: int) -> int:
+        if self.stamp[i] == self.epoch:
+            return self.h[i]
+        r, c = divmod(i, self.n)
+        gr, gc = divmod(self.goal, self.n)
+        return abs(r - gr) + abs(c - gc)
+
+    def learn(self, ids: Sequence[int], gvals: Sequence[int], g_goal: int) -> None:
+        h, stamp, ep = self.h, self.stamp, self.epoch
+        for i, gv in zip(ids, gvals):
+            h[i] = g_goal - gv
+            stamp[i] = ep
+
+_LEARNED_MAGIC = b"FTRH"
+
+def learned_file(store: str, key: str, goal: int) -> str:
+    return os.path.join(store, f"{key}_{goal}.ftrh")
+
+def save_learned(lh: LearnedHeuristic, path: str) -> None:
+    """
+    Write the learned values and their walls; temp file plus rename, so
+    concurrent bench workers never read a partial file. Arrays are in
+    native byte order (the file is a local cache, not an exchange format).
+    """
+    ids = array("i", (i for i in range(lh.n * lh.n) if lh.stamp[i] == lh.epoch))
+    vals = array("i", (lh.h[i] for i in ids))
+    walls = array("i", sorted(lh.walls))
+    d = os.path.dirname(path) or "."
+    os.makedirs(d, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=d, suffix=".tmp")
+    with os.fdopen(fd, "wb") as f:
+        f.write(_LEARNED_MAGIC + struct.pack("<IIII", lh.n, lh.goal, len(ids), len(walls)))
+        f.write(ids.tobytes() + vals.tobytes() + walls.tobytes())
+    os.replace(tmp, path)
+
+def load_learned(path: str, n: int, goal: int) -> Optional[LearnedHeuristic]:
+    """A saved table for an n x n grid and `goal`; None if missing, foreign or damaged."""
+    try:
+        with open(path, "rb") as f:
+            data = f.read()
+    except OSError:
+        return None
+    head = len(_LEARNED_MAGIC) + 16
+    if data[:len(_LEARNED_MAGIC)] != _LEARNED_MAGIC or len(data) < head:
+        return None
+    fn, fgoal, count, nwalls = struct.unpack("<IIII", data[len(_LEARNED_MAGIC):head])
+    size = array("i").itemsize
+    if (fn, fgoal) != (n, goal) or len(data) != head + (2 * count + nwalls) * size:
+        return None
+    cols = array("i")
+    cols.frombytes(data[head:])
+    lh = LearnedHeuristic(n, goal)
+    h, stamp, ep = lh.h, lh.stamp, lh.epoch
+    for i, v in zip(cols[:count], cols[count:2 * count]):
+        h[i] = v
+        stamp[i] = ep
+    lh.walls = set(cols[2 * count:])
+    return lh
+
+# learned tables kept between runs, keyed by grid content hash and goal
+_LEARNED: "OrderedDict[str, LearnedHeuristic]" = OrderedDict()
+LEARNED_CACHE_SIZE = 8
+
+def learned_heuristic(key: str, n: int, goal: int, store: str = "") -> LearnedHeuristic:
+    """
+    Shared LearnedHeuristic for `key` (LRU over the last few grids). With a
+    `store` folder, a table not in memory is loaded from what save_learned
+    wrote there, so learning carries across processes.
+    """
+    lru_key = f"{key}:{goal}"
+    lh = _LEARNED.get(lru_key)
+    if lh is None or lh.n != n:
+        lh = (load_learned(learned_file(store, key, goal), n, goal) if store else None) or LearnedHeuristic(n, goal)
+        _LEARNED[lru_key] = lh
+        while len(_LEARNED) > LEARNED_CACHE_SIZE:
+            _LEARNED.popitem(last=False)
+    _LEARNED.move_to_end(lru_key)
+    return lh
@@ -0,0 +1,281 @@
+# ftr/hpa.py
+from __future__ import annotations
+from array import array
+from typing import Dict, List, Optional, Set, Tuple
+import heapq
+from .grid import rect_neighbor_table
+from .knowledge import Knowledge
+
+# kb.blocked bytes -> 1 where the cell may be entered
+_FLIP = bytes([1, 0]) + bytes(254)
+
+# CSR 4-neighborhoods of h x w blocks, cached per block shape
+_BLOCK_TABLES: Dict[Tuple[int, int], Tuple[array, array]] = {}
+
+def _block_table(h: int, w: int) -> Tuple[array, array]:
+    tbl = _BLOCK_TABLES.get((h, w))
+    if tbl is None:
+        tbl = _BLOCK_TABLES[(h, w)] = rect_neighbor_table(h, w)
+    return tbl
+
+def _block_bfs(free: bytes, h: int, w: int, src: int, targets: Optional[Set[int]] = None) -> Tuple[List[int], List[int]]:
+    """
+    Breadth-first distances (-1 = unreached) over block-local ids, and the
+    ids in visiting order. Ends early once every id in `targets` is reached.
+    """
+    off, ids = _block_table(h, w)
+    dist = [-1] * (h * w)
+    dist[src] = 0
+    order = [src]
+    frontier = [src]
+    left = len(targets - {src}) if targets is not None else -1
+    d = 0
+    while frontier and left:
+        d += 1
+        nxt = []
+        for s in frontier:
+            for j in ids[off[s]:off[s + 1]]:
+                if free[j] and dist[j] < 0:
+                    dist[j] = d
+                    nxt.append(j)
+                    if targets is not None and j in targets:
+                        left -= 1
+        order.extend(nxt)
+        frontier = nxt
+    return dist, order
+
+class HPAGraph:
+    """
+    HPA*-style abstraction of the agent's knowledge (unknown cells free).
+
+    The grid is cut into `cluster` x `cluster` blocks. Along each border
+    between two blocks, every maximal run of cells free on both sides gets
+    transitions: one pair in the middle of short runs, one at each end of
+    runs of 6 or more. Transition cells are the abstract nodes; they are
+    linked across the border with cost 1 and, inside a block, by their
+    in-block shortest distances (intra edges).
+
+    Borders and intra edges are built lazily the first time a search needs
+    them. `sync` reads the cells newly marked blocked in `kb` and drops only
+    the intra edges of the blocks containing them (and the borders, plus the
+    block across, when such a cell lies on a border); they are rebuilt on
+    next use.
+    """
+    def __init__(self, n: int, kb: Knowledge, cluster: int = 16):
+        self.n = n
+        self.kb = kb
+        self.K = cluster
+        self.m = (n + cluster - 1) // cluster       # blocks per side
+        self.epoch = kb.epoch
+        self._border: Dict[Tuple[int, int], Set[Tuple[int, int]]] = {}
+        self._intra: Dict[int, Dict[int, List[Tuple[int, int]]]] = {}
+        self.rebuilds = 0                            # intra-edge tables computed
+        # work since the last reset: abstract nodes expanded plus cells visited
+        # by in-block searches; the cell ids themselves are kept only if `record`
+        self.expansions = 0
+        self.record = True
+        self.expanded: List[int] = []
+
+    # ----- geometry -----
+    def cluster_of(self, i: int) -> int:
+        r, c = divmod(i, self.n)
+        return (r // self.K) * self.m + c // self.K
+
+    def bounds(self, cid: int) -> Tuple[int, int, int, int]:
+        """r0, r1, c0, c1 (exclusive ends) of block `cid`."""
+        br, bc = divmod(cid, self.m)
+        K, n = self.K, self.n
+        return br * K, min(n, br * K + K), bc * K, min(n, bc * K + K)
+
+    # ----- borders -----
+    def border(self, a: int, b: int) -> Set[Tuple[int, int]]:
+        """Transitions (cell in a, cell in b) between block a and its right or lower neighbor b."""
+        key = (a, b)
+        tr = self._border.get(key)
+        if tr is not None:
+            return tr
+        n, bl = self.n, self.kb.blocked
+        r0, r1, c0, c1 = self.bounds(a)
+        if b == a + 1:
+            pairs = [((r * n + c1 - 1), (r * n + c1)) for r in range(r0, r1)]
+        else:
+            pairs = [((r1 - 1) * n + c, r1 * n + c) for c in range(c0, c1)]
+        tr = set()
+        run: List[Tuple[int, int]] = []
+        for p in pairs + [None]:
+            if p is not None and not bl[p[0]] and not bl[p[1]]:
+                run.append(p)
+                continue
+            if run:
+                if len(run) < 6:
+                    tr.add(run[len(run) // 2])
+                else:
+                    tr.add(run[0])
+                    tr.add(run[-1])
+                run = []
+        self._border[key] = tr
+        return tr
+
+    def _borders_of(self, cid: int) -> List[Tuple[int, int, bool]]:
+        # (a, b, cid is a) for each existing neighbor block
+        m = self.m
+        br, bc = divmod(cid, m)
+        out = []
+        if bc > 0:
+            out.append((cid - 1, cid, False))
+        if bc < m - 1:
+            out.append((cid, cid + 1, True))
+        if br > 0:
+            out.append((cid - m, cid, False))
+        if br < m - 1:
+            out.append((cid, cid + m, True))
+        return out
+
+    def nodes(self, cid: int) -> Set[int]:
+        out: Set[int] = set()
+        for a, b, first in self._borders_of(cid):
+            for p in self.border(a, b):
+                out.add(p[0] if first else p[1])
+        return out
+
+    # ----- in-block distances -----
+    def _block(self, cid: int) -> Tuple[int, int, int, int, bytes]:
+        """r0, c0, height, width and a free-cell map (1 = not known blocked) of block cid, row-major."""
+        n, bl = self.n, self.kb.blocked
+        r0, r1, c0, c1 = self.bounds(cid)
+        free = b"".join(bl[r * n + c0:r * n + c1] for r in range(r0, r1)).translate(_FLIP)
+        return r0, c0, r1 - r0, c1 - c0, free
+
+    def _open_block(self, cid: int) -> bool:
+        n, bl = self.n, self.kb.blocked
+        r0, r1, c0, c1 = self.bounds(cid)
+        return all(bl.find(1, r * n + c0, r * n + c1) == -1 for r in range(r0, r1))
+
+    def _dists(self, src: int, cid: int, targets: Set[int],
+               blk: Optional[Tuple[int, int, int, int, bytes]] = None) -> List[Tuple[int, int]]:
+        """(target, in-block distance) for the targets reachable from src without leaving block cid."""
+        n = self.n
+        # a block with no known walls is a rectangle: distances are Manhattan
+        if blk is None and self._open_block(cid):
+            sr, sc = divmod(src, n)
+            return [(t, abs(t // n - sr) + abs(t % n - sc)) for t in targets if t != src]
+        r0, c0, h, w, free = blk or self._block(cid)
+        local = {(t // n - r0) * w + t % n - c0: t for t in targets}
+        dist, order = _block_bfs(free, h, w, (src // n - r0) * w + src % n - c0, set(local))
+        self._visited(r0, c0, w, order)
+        return [(t, dist[k]) for k, t in local.items() if t != src and dist[k] >= 0]
+
+    def _visited(self, r0: int, c0: int, w: int, order: List[int]) -> None:
+        self.expansions += len(order)
+        if self.record:
+            n = self.n
+            self.expanded.extend((r0 + k // w) * n + c0 + k % w for k in order)
+
+    def intra(self, cid: int) -> Dict[int, List[Tuple[int, int]]]:
+        tbl = self._intra.get(cid)
+        if tbl is None:
+            nodes = self.nodes(cid)
+            blk = None if self._open_block(cid) else self._block(cid)
+            tbl = {u: self._dists(u, cid, nodes, blk) for u in nodes}
+            self._intra[cid] = tbl
+            self.rebuilds += 1
+        return tbl
+
+    def sync(self) -> None:
+        """Invalidate what the cells blocked since the last sync touched."""
+        K, m, n = self.K, self.m, self.n
+        for i in self.kb.blocked_since(self.epoch):
+            cid = self.cluster_of(i)
+            self._intra.pop(cid, None)
+            r, c = divmod(i, n)
+            br, bc = divmod(cid, m)
+            for edge, nb in ((c % K == 0 and bc > 0, cid - 1), (c % K == K - 1 and bc < m - 1, cid + 1),
+                             (r % K == 0 and br > 0, cid - m), (r % K == K - 1 and br < m - 1, cid + m)):
+                if edge:
+                    self._border.pop((min(cid, nb), max(cid, nb)), None)
+                    self._intra.pop(nb, None)
+        self.epoch = self.kb.epoch
+
+    # ----- search -----
+    def plan(self, start: int, goal: int) -> Optional[List[int]]:
+        """
+        Abstract path [start, ..., goal] of waypoints; consecutive waypoints
+        are either in the same block or adjacent across a border.
+        """
+        self.sync()
+        n = self.n
+        sc, gc = self.cluster_of(start), self.cluster_of(goal)
+        gr_, gc_ = divmod(goal, n)
+        # temporary edges: start -> its block's nodes (and goal), block nodes -> goal
+        s_edges = self._dists(start, sc, self.nodes(sc) | ({goal} if sc == gc else set()))
+        to_goal = dict(self._dists(goal, gc, self.nodes(gc)))
+
+        g: Dict[int, int] = {start: 0}
+        parent: Dict[int, int] = {start: -1}
+        closed: Set[int] = set()
+        cnt = 0
+        sr, scol = divmod(start, n)
+        openh = [(abs(sr - gr_) + abs(scol - gc_), 0, cnt, start)]
+        while openh:
+            _, _, _, u = heapq.heappop(openh)
+            if u in closed:
+                continue
+            closed.add(u)
+            self.expansions += 1
+            if self.record:
+                self.expanded.append(u)
+            if u == goal:
+                path = [u]
+                while parent[u] != -1:
+                    u = parent[u]
+                    path.append(u)
+                path.reverse()
+                return path
+            gu = g[u]
+            cid = self.cluster_of(u)
+            edges = list(s_edges) if u == start else list(self.intra(cid).get(u, ()))
+            if cid == gc and u in to_goal:
+                edges.append((goal, to_goal[u]))
+            r, c = divmod(u, n)
+            for v, ok in ((u - n, r > 0), (u + n, r < n - 1), (u - 1, c > 0), (u + 1, c < n - 1)):
+                if ok:
+                    cv = self.cluster_of(v)
+                    if cv != cid:
+                        a, b = (cid, cv) if cid < cv else (cv, cid)
+                        if ((u, v) if cid < cv else (v, u)) in self.border(a, b):
+                            edges.append((v, 1))
+            for v, d in edges:
+                t = gu + d
+                if v not in g or t < g[v]:
+                    g[v] = t
+                    parent[v] = u
+                    vr, vc = divmod(v, n)
+                    cnt += 1
+                    heapq.heappush(openh, (t + abs(vr - gr_) + abs(vc - gc_), -t, cnt, v))
+        return None
+
+    def refine(self, a: int, b: int) -> Optional[List[int]]:
+        """Cell path a..b for one abstract leg, or None if b is no longer reachable inside the block."""
+        ca = self.cluster_of(a)
+        if ca != self.cluster_of(b):
+            return [a, b]
+        n = self.n
+        r0, c0, h, w, free = self._block(ca)
+        la = (a // n - r0) * w + a % n - c0
+        lb = (b // n - r0) * w + b % n - c0
+        dist, order = _block_bfs(free, h, w, lb, {la})
+        self._visited(r0, c0, w, order)
+        if dist[la] < 0:
+            return None
+        # walk down the distance field from a to b
+        off, ids = _block_table(h, w)
+        path = [la]
+        k = la
+        while k != lb:
+            d = dist[k] - 1
+            for j in ids[off[k]:off[k + 1]]:
+                if dist[j] == d:
+                    k = j
+                    break
+            path.append(k)
+        return [(r0 + k // w) * n + c0 + k % w for k in path]
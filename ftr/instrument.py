@@ -0,0 +1,56 @@
+# ftr/instrument.py
+from __future__ import annotations
+from dataclasses import dataclass
+from typing import Dict, List
+from .astar import AStarResult
+from .grid import neighbor_table
+from .knowledge import Knowledge
+from .stats import summarize
+
+@dataclass
+class ReplanRecord:
+    kind: str            # "search", "repair" or "plan" (planners without an AStarResult)
+    sec: float
+    expansions: int
+    pushes: int = 0
+    stale_pops: int = 0
+    rejected: int = 0    # neighbors of expanded cells skipped as known blocked
+
+class Probe:
+    """
+    Instrumentation for planners and astar_once, enabled by passing
+    `probe=Probe()`. Planners call `on_search` after every A* search and
+    `on_plan` after planning steps that have no AStarResult; nothing runs per
+    expanded node. Open-list counts come from the finished search, and
+    rejections are recounted from the expanded cells afterwards, so without a
+    probe the search loop is unchanged. Subclass to route records elsewhere.
+    """
+    def __init__(self):
+        self.records: List[ReplanRecord] = []
+
+    def on_search(self, res: AStarResult, sec: float, kb: Knowledge, kind: str = "search") -> None:
+        off, ids = neighbor_table(kb.n)
+        bl = kb.blocked
+        rejected = 0
+        for s in res.expanded_ids:
+            for j in ids[off[s]:off[s + 1]]:
+                rejected += bl[j]
+        self.records.append(ReplanRecord(kind, sec, res.expansions, res.pushes, res.pops - res.expansions, rejected))
+
+    def on_plan(self, expansions: int, sec: float) -> None:
+        self.records.append(ReplanRecord("plan", sec, expansions))
+
+    def counters(self) -> Dict[str, int]:
+        out = {"searches": 0, "repairs": 0, "plans": 0, "expansions": 0,
+               "pushes": 0, "stale_pops": 0, "rejected": 0}
+        for r in self.records:
+            out[r.kind + "es" if r.kind == "search" else r.kind + "s"] += 1
+            out["expansions"] += r.expansions
+            out["pushes"] += r.pushes
+            out["stale_pops"] += r.stale_pops
+            out["rejected"] += r.rejected
+        return out
+
+    def latency(self) -> Dict[str, float]:
+        """median / mean / p95 / std of the recorded planning times."""
+        return summarize([r.sec for r in self.records])
@@ -0,0 +1,161 @@
+# ftr/jps.py
+from __future__ import annotations
+from typing import List
+import heapq
+from .astar import AStarEngine, AStarResult
+from .knowledge import Knowledge
+
+def _jump_h(bl: bytearray, n: int, x: int, dx: int, goal: int) -> int:
+    """
+    Horizontal jump entering cell x from x - dx. Returns the first jump point
+    along the row (the goal, or a cell with a forced vertical neighbor), or -1.
+    Runs of free cells and wall edges in the two neighboring rows are located
+    with bytearray.find/rfind instead of stepping cell by cell.
+    """
+    rs = x - x % n
+    if dx > 0:
+        e = bl.find(1, x, rs + n)
+        if e == -1:
+            e = rs + n
+        if e == x:
+            return -1
+        best = goal if x <= goal < e else e
+        # forced at k: neighbor row is blocked at k-1 and free at k
+        for d in (-n, n):
+            if 0 <= rs + d < n * n:
+                p = bl.find(1, x - 1 + d, best - 1 + d)
+                if p != -1:
+                    q = bl.find(0, p + 1, best + d)
+                    if q != -1:
+                        best = q - d
+        return best if best < e else -1
+    e = bl.rfind(1, rs, x + 1)
+    if e == -1:
+        e = rs - 1
+    if e == x:
+        return -1
+    best = goal if e < goal <= x else e
+    # forced at k: neighbor row is blocked at k+1 and free at k
+    for d in (-n, n):
+        if 0 <= rs + d < n * n:
+            p = bl.rfind(1, best + 2 + d, x + 2 + d)
+            if p != -1:
+                q = bl.rfind(0, best + 1 + d, p)
+                if q != -1:
+                    best = q - d
+    return best if best > e else -1
+
+def _jump_v(bl: bytearray, n: int, x: int, dy: int, goal: int) -> int:
+    """
+    Vertical jump entering cell x from x - dy. Vertical moves come first in
+    canonical paths, so every cell on the way scans both horizontal
+    directions and becomes a jump point if either scan finds one.
+    """
+    N = n * n
+    while 0 <= x < N and not bl[x]:
+        if x == goal:
+            return x
+        c = x % n
+        if c > 0 and _jump_h(bl, n, x - 1, -1, goal) != -1:
+            return x
+        if c < n - 1 and _jump_h(bl, n, x + 1, 1, goal) != -1:
+            return x
+        x += dy
+    return -1
+
+def jps_search(
+    engine: AStarEngine,
+    start: int,
+    goal: int,
+    kb: Knowledge,
+    tie_break: str = "larger_g",
+) -> AStarResult:
+    """
+    Jump Point Search over the agent's knowledge, adapted to 4-connected
+    uniform-cost grids (unknown cells free, known-blocked forbidden). Of all
+    shortest paths only the canonical ones (vertical moves as early as
+    possible) are followed; straight runs are skipped, so only jump points
+    enter the open list and count as expansions. Path lengths equal those of
+    plain A*; `path_ids` is filled in cell by cell between jump points.
+    """
+    n = engine.n
+    N = n * n
+    gen = engine._next_gen()
+    g, parent, seen, closed = engine.g, engine.parent, engine.seen, engine.closed
+    bl = kb.blocked
+    larger = tie_break == "larger_g"
+    B = engine._bits
+    mask = (1 << B) - 1
+    heappush, heappop = heapq.heappush, heapq.heappop
+    gr, gc = divmod(goal, n)
+    expanded: List[int] = []
+    g_expanded: List[int] = []
+
+    sr, sc = divmod(start, n)
+    g[start] = 0
+    parent[start] = -1
+    seen[start] = gen
+    push_node = [start]
+    openh = [(((abs(sr - gr) + abs(sc - gc)) << B) | (N if larger else 0)) << B]
+
+    while openh:
+        s = push_node[heappop(openh) & mask]
+        if closed[s] == gen:
+            continue
+        closed[s] = gen
+        gs = g[s]
+        expanded.append(s)
+        g_expanded.append(gs)
+
+        if s == goal:
+            path = [s]
+            while parent[s] != -1:
+                p = parent[s]
+                step = (1 if p > s else -1) if p // n == s // n else (n if p > s else -n)
+                while s != p:
+                    s += step
+                    path.append(s)
+            path.reverse()
+            return AStarResult(n, path, expanded, g_expanded, len(push_node), len(push_node) - len(openh))
+
+        r, c = divmod(s, n)
+        p = parent[s]
+        succ: List[int] = []
+        if p == -1:
+            if c < n - 1:
+                succ.append(_jump_h(bl, n, s + 1, 1, goal))
+            if c > 0:
+                succ.append(_jump_h(bl, n, s - 1, -1, goal))
+            succ.append(_jump_v(bl, n, s - n, -n, goal))
+            succ.append(_jump_v(bl, n, s + n, n, goal))
+        elif p // n == r:
+            dx = 1 if s > p else -1
+            if 0 <= c + dx < n:
+                succ.append(_jump_h(bl, n, s + dx, dx, goal))
+            # forced turns: the cell beside the previous one is blocked
+            for dy in (-n, n):
+                if 0 <= s + dy < N and not bl[s + dy] and bl[s - dx + dy]:
+                    succ.append(_jump_v(bl, n, s + dy, dy, goal))
+        else:
+            dy = n if s > p else -n
+            if c < n - 1:
+                succ.append(_jump_h(bl, n, s + 1, 1, goal))
+            if c > 0:
+                succ.append(_jump_h(bl, n, s - 1, -1, goal))
+            succ.append(_jump_v(bl, n, s + dy, dy, goal))
+
+        for j in succ:
+            if j < 0:
+                continue
+            jr, jc = divmod(j, n)
+            t = gs + abs(jr - r) + abs(jc - c)
+            if seen[j] != gen or t < g[j]:
+                seen[j] = gen
+                g[j] = t
+                parent[j] = s
+                hj = abs(jr - gr) + abs(jc - gc)
+                gterm = N - t if larger else t
+                heappush(openh, ((((t + hj) << B) | gterm) << B) | len(push_node))
+                push_node.append(j)
+
+    return AStarResult(n, None, expanded, g_expanded, len(push_node), len(push_node) - len(openh))
@@ -1,34 +1,94 @@
 # ftr/knowledge.py
 from __future__ import annotations
-from typing import Set
+from array import array
+from typing import Iterable, List, Set
 from .types import Coord
-from .grid import GridWorld
+from .grid import GridWorld, neighbor_table
+
+UNKNOWN, FREE, BLOCKED = 0, 1, 2
 
 class Knowledge:
     """
     Agent's knowledge:
     - Treat UNKNOWN cells as traversable when planning
     - Only forbid cells known to be blocked
+
+    State is kept per cell id (r*n+c) in byte buffers: `state` holds
+    UNKNOWN/FREE/BLOCKED and `blocked` is 1 exactly where state is BLOCKED,
+    so planners can test it directly. Every status change is appended to
+    `log`; `epoch` is its length and `changed_since(epoch)` lists the cells
+    touched after that point.
     """
     def __init__(self, n: int):
         self.n = n
-        self.known_blocked: Set[Coord] = set()
-        self.known_unblocked: Set[Coord] = set()
+        self.state = bytearray(n * n)
+        self.blocked = bytearray(n * n)
+        self.log = array("l")
 
-    def is_known_blocked(self, s: Coord) -> bool:
-        return s in self.known_blocked
+    # ----- change log -----
+    @property
+    def epoch(self) -> int:
+        return len(self.log)
+
+    def changed_since(self, epoch: int) -> array:
+        return self.log[epoch:]
+
+    def blocked_since(self, epoch: int) -> List[int]:
+        blocked = self.blocked
+        return [i for i in self.log[epoch:] if blocked[i]]
+
+    # ----- updates -----
+    def mark_id(self, i: int, blocked: bool) -> None:
+        st = BLOCKED if blocked else FREE
+        if self.state[i] != st:
+            self.state[i] = st
+            self.blocked[i] = 1 if blocked else 0
+            self.log.append(i)
 
     def mark(self, s: Coord, blocked: bool) -> None:
-        if blocked:
-            self.known_blocked.add(s)
-            self.known_unblocked.discard(s)
-        else:
-            self.known_unblocked.add(s)
-            self.known_blocked.discard(s)
+        self.mark_id(s[0] * self.n + s[1], blocked)
+
+    def mark_many(self, ids: Iterable[int], blocked: bool) -> None:
+        st = BLOCKED if blocked else FREE
+        bv = 1 if blocked else 0
+        state, bmap, log = self.state, self.blocked, self.log
+        for i in ids:
+            if state[i] != st:
+                state[i] = st
+                bmap[i] = bv
+                log.append(i)
+
+    def sense(self, world: GridWorld, at: int) -> None:
+        """Reveal the true status of every neighbor of cell id `at`."""
+        off, ids = neighbor_table(self.n)
+        cells, state, bmap, log = world.cells, self.state, self.blocked, self.log
+        for j in ids[off[at]:off[at + 1]]:
+            b = cells[j]
+            st = BLOCKED if b else FREE
+            if state[j] != st:
+                state[j] = st
+                bmap[j] = b
+                log.append(j)
 
     def sense_neighbors(self, world: GridWorld, at: Coord) -> None:
-        for nb in world.neighbors(at):
-            self.mark(nb, blocked=world.is_blocked(nb))
+        self.sense(world, at[0] * self.n + at[1])
+
+    # ----- queries -----
+    def is_known_blocked(self, s: Coord) -> bool:
+        return self.blocked[s[0] * self.n + s[1]] == 1
 
     def traversable_for_planning(self, s: Coord) -> bool:
-        return not self.is_known_blocked(s)
+        return not self.blocked[s[0] * self.n + s[1]]
+
+    def traversable_id(self, i: int) -> bool:
+        return not self.blocked[i]
+
+    @property
+    def known_blocked(self) -> Set[Coord]:
+        n = self.n
+        return {divmod(i, n) for i, st in enumerate(self.state) if st == BLOCKED}
+
+    @property
+    def known_unblocked(self) -> Set[Coord]:
+        n = self.n
+        return {divmod(i, n) for i, st in enumerate(self.state) if st == FREE}
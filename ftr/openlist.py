@@ -0,0 +1,74 @@
+# ftr/openlist.py
+from __future__ import annotations
+from collections import deque
+from typing import Deque, Dict, List
+import heapq
+
+_NONE = 1 << 62     # head key when nothing is cached
+
+class BucketOpenList:
+    """
+    Two-level bucket queue for small integer keys. Level one is a list of f
+    buckets scanned upwards (Dial); inside an f bucket, one FIFO per gterm,
+    with the live gterms on a small heap. The smallest (f, gterm) FIFO is
+    cached as `head`, so most pops are a single popleft and a push only
+    touches the heap when its (f, gterm) pair is new. Pop order matches
+    AStarSearch's packed heap exactly (FIFO among equal keys); a push below
+    the head (inconsistent heuristics) simply becomes the new head.
+    """
+    def __init__(self):
+        self.buckets: List[Dict[int, Deque[int]]] = []
+        self.gkeys: List[List[int]] = []
+        self.head: Deque[int] = deque()
+        self.hf = self.hg = _NONE
+        self.pushes = 0
+        self.pops = 0
+
+    def push(self, f: int, gterm: int, node: int) -> None:
+        try:
+            fb = self.buckets[f]
+        except IndexError:
+            grow = f + 1 - len(self.buckets)
+            self.buckets.extend({} for _ in range(grow))
+            self.gkeys.extend([] for _ in range(grow))
+            fb = self.buckets[f]
+        q = fb.get(gterm)
+        if q is None:
+            q = fb[gterm] = deque()
+            heapq.heappush(self.gkeys[f], gterm)
+        q.append(node)
+        self.pushes += 1
+        if f <= self.hf and (f < self.hf or gterm < self.hg):
+            self.head, self.hf, self.hg = q, f, gterm
+
+    def pop(self) -> int:
+        """Node with the smallest (f, gterm), or -1 when empty."""
+        q = self.head
+        if not q:
+            q = self._advance()
+            if q is None:
+                return -1
+        self.pops += 1
+        return q.popleft()
+
+    def _advance(self) -> "Deque[int] | None":
+        # the head ran dry: drop empty FIFOs and scan up to the next live one
+        buckets, gkeys = self.buckets, self.gkeys
+        f = 0 if self.hf == _NONE else self.hf
+        while f < len(gkeys):
+            keys, fb = gkeys[f], buckets[f]
+            while keys and not fb[keys[0]]:
+                del fb[heapq.heappop(keys)]
+            if keys:
+                self.head, self.hf, self.hg = fb[keys[0]], f, keys[0]
+                return self.head
+            f += 1
+        self.hf = self.hg = _NONE
+        return None
+
+    def __len__(self) -> int:
+        return self.pushes - self.pops
+
+# open lists AStarSearch can use besides its built-in heap, by `queue` name;
+# each needs push(f, gterm, node), pop() -> node or -1, `pushes` and __len__
+OPEN_LISTS = {"bucket": BucketOpenList}
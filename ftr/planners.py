@@ -1,14 +1,25 @@
 # ftr/planners.py
 from __future__ import annotations
-from dataclasses import dataclass
-from typing import Dict, List, Optional, Set, Tuple
+from collections import deque
+from dataclasses import dataclass, field
+from functools import partial
+from typing import Callable, Deque, Dict, List, Optional, Set, Union
 import time
 
 from .types import Coord
 from .grid import GridWorld
 from .knowledge import Knowledge
-from .astar import astar_once
-from .heuristics import manhattan  # used for initializing adaptive table
+from .astar import engine_for
+from .bidir import bidir_search
+from .dstar import DStarLite
+from .hpa import HPAGraph
+from .instrument import Probe
+from .jps import jps_search
+from .tracefile import TraceWriter
+from .wavefront import Wavefront
+from .heuristics import LearnedHeuristic, learned_file, learned_heuristic, save_learned
+
+clock = time.perf_counter
 
 @dataclass
 class RunStats:
@@ -19,122 +30,577 @@ class RunStats:
     elapsed_sec: float
     path_taken: List[Coord]
     expanded_all: Set[Coord]
+    plan_sec: float = 0.0     # time inside the search
+    sense_sec: float = 0.0    # time inside Knowledge.sense
+    expansions_fwd: int = 0   # bidirectional planners: expansions per direction
+    expansions_bwd: int = 0
+    repairs: int = 0          # local detours spliced in instead of a full replan
+    repair_expansions: int = 0  # part of `expansions` spent on those detours
+    # filled only when the planner ran with a Probe
+    counters: Dict[str, int] = field(default_factory=dict)
+    replan_sec: List[float] = field(default_factory=list)
+
+    @property
+    def move_sec(self) -> float:
+        # everything else: walking the path, marking cells, bookkeeping
+        return max(0.0, self.elapsed_sec - self.plan_sec - self.sense_sec)
 
 def _init(kb: Knowledge, world: GridWorld) -> None:
     kb.mark(world.start, False)
     kb.mark(world.goal, False)
     kb.sense_neighbors(world, world.start)
 
-def repeated_forward(world: GridWorld, tie_break: str = "larger_g") -> RunStats:
+class _Trace:
+    """
+    Collects what a run leaves behind in RunStats. Full mode keeps the whole
+    trajectory and every expanded cell (for demo/PNGs). Lean mode only counts
+    moves; with sample > 0 it also keeps the last `sample` positions and up to
+    `sample` cells expanded by the most recent replan. A probe's counters
+    and per-replan times are copied into RunStats at the end. A recorder
+    (tracefile.TraceWriter) additionally gets every search's expanded cells
+    and proposed path, each move and each bumped wall as they happen, so a
+    lean run can still be replayed step by step from disk.
+    """
+    def __init__(self, world: GridWorld, lean: bool = False, sample: int = 0, probe: Optional[Probe] = None,
+                 recorder: Optional[TraceWriter] = None):
+        self.n = world.n
+        self.probe = probe
+        self.recorder = recorder
+        self.lean = lean
+        self.sample = sample
+        # planners that can skip collecting expanded ids (HPA, wavefront) check this
+        self.keeps_ids = not lean or bool(sample) or recorder is not None
+        self.moves = 0
+        self.path: Union[List[int], Deque[int]] = deque([world.idx(world.start)], maxlen=sample) if lean else [world.idx(world.start)]
+        self.expanded_ids: Set[int] = set()
+        if recorder is not None:
+            recorder.begin(world)
+
+    def step(self, cur: int) -> None:
+        self.moves += 1
+        if not self.lean or self.sample:
+            self.path.append(cur)
+        if self.recorder is not None:
+            self.recorder.move(cur)
+
+    def expanded(self, ids: List[int]) -> None:
+        if not self.lean:
+            self.expanded_ids.update(ids)
+        elif self.sample:
+            self.expanded_ids = set(ids[:self.sample])
+        if self.recorder is not None:
+            self.recorder.expanded(ids)
+
+    def proposed(self, path: List[int]) -> None:
+        if self.recorder is not None:
+            self.recorder.proposed(path)
+
+    def descent(self, next_step: Callable[[int], int], cur: int, goal: int) -> None:
+        """For field planners (D* Lite, wavefront): record the path next_step would walk."""
+        if self.recorder is None:
+            return
+        path = [cur]
+        while cur != goal and len(path) <= self.n * self.n:
+            cur = next_step(cur)
+            if cur < 0:
+                break
+            path.append(cur)
+        self.recorder.proposed(path)
+
+    def blocked(self, cell: int) -> None:
+        if self.recorder is not None:
+            self.recorder.blocked(cell)
+
+    def stats(self, reached: bool, replans: int, expansions: int, elapsed: float,
+              plan_sec: float, sense_sec: float, expansions_fwd: int = 0, expansions_bwd: int = 0,
+              repairs: int = 0, repair_expansions: int = 0) -> RunStats:
+        n = self.n
+        st = RunStats(reached, self.moves, replans, expansions, elapsed, [divmod(i, n) for i in self.path],
+                      {divmod(i, n) for i in self.expanded_ids}, plan_sec, sense_sec,
+                      expansions_fwd, expansions_bwd, repairs, repair_expansions)
+        if self.probe is not None:
+            st.counters = self.probe.counters()
+            st.replan_sec = [r.sec for r in self.probe.records]
+        if self.recorder is not None:
+            self.recorder.end(reached)
+        return st
+
+def repeated_forward(world: GridWorld, tie_break: str = "larger_g", lean: bool = False, sample: int = 0,
+                     jps: bool = False, repair: bool = False, repair_bound: int = 1024,
+                     queue: str = "heap", probe: Optional[Probe] = None,
+                     recorder: Optional[TraceWriter] = None) -> RunStats:
+    """
+    Repeated forward A*; with jps, each replan uses Jump Point Search instead.
+    With repair, a blocked step first tries AStarEngine.detour (at most
+    `repair_bound` expansions) back onto the rest of the path; only if that
+    fails does it replan from scratch. `queue` picks the A* open list
+    (openlist.OPEN_LISTS); JPS keeps its own heap.
+    """
     kb = Knowledge(world.n)
     _init(kb, world)
-    cur = world.start
+    cells = world.cells
+    cur = world.idx(world.start)
+    goal_id = world.idx(world.goal)
 
     expansions_total = 0
     replans = 0
-    path_taken: List[Coord] = [cur]
-    expanded_all: Set[Coord] = set()
+    repairs = repair_exp = 0
+    trace = _Trace(world, lean, sample, probe, recorder)
+    engine = engine_for(world)
+    search = partial(jps_search, engine) if jps else partial(engine.search, queue=queue)
+    plan_sec = sense_sec = 0.0
     t0 = time.perf_counter()
 
-    while cur != world.goal:
-        res = astar_once(cur, world.goal, world, kb, tie_break=tie_break)
+    while cur != goal_id:
+        tp = clock()
+        res = search(cur, goal_id, kb, tie_break=tie_break)
+        dt = clock() - tp
+        plan_sec += dt
+        if probe is not None:
+            probe.on_search(res, dt, kb)
         replans += 1
-        expansions_total += len(res.expanded)
-        expanded_all |= res.expanded
+        expansions_total += res.expansions
+        trace.expanded(res.expanded_ids)
 
-        if res.path is None:
-            return RunStats(False, len(path_taken) - 1, replans, expansions_total, time.perf_counter() - t0, path_taken, expanded_all)
+        if res.path_ids is None:
+            return trace.stats(False, replans, expansions_total, time.perf_counter() - t0, plan_sec, sense_sec,
+                               repairs=repairs, repair_expansions=repair_exp)
 
-        for step in res.path[1:]:
-            if world.is_blocked(step):
-                kb.mark(step, True)
-                kb.sense_neighbors(world, cur)
+        path = res.path_ids
+        trace.proposed(path)
+        k = 1
+        while k < len(path):
+            step = path[k]
+            if cells[step]:
+                kb.mark_id(step, True)
+                trace.blocked(step)
+                ts = clock()
+                kb.sense(world, cur)
+                sense_sec += clock() - ts
+                if repair:
+                    tp = clock()
+                    rep = engine.detour(path, k - 1, kb, repair_bound)
+                    dt = clock() - tp
+                    plan_sec += dt
+                    if probe is not None:
+                        probe.on_search(rep, dt, kb, kind="repair")
+                    expansions_total += rep.expansions
+                    repair_exp += rep.expansions
+                    trace.expanded(rep.expanded_ids)
+                    if rep.path_ids is not None:
+                        repairs += 1
+                        path, k = rep.path_ids, 1
+                        trace.proposed(path)
+                        continue
                 break
             cur = step
-            path_taken.append(cur)
-            kb.mark(cur, False)
-            kb.sense_neighbors(world, cur)
-            if cur == world.goal:
+            trace.step(cur)
+            kb.mark_id(cur, False)
+            ts = clock()
+            kb.sense(world, cur)
+            sense_sec += clock() - ts
+            if cur == goal_id:
                 break
+            k += 1
 
-    return RunStats(True, len(path_taken) - 1, replans, expansions_total, time.perf_counter() - t0, path_taken, expanded_all)
+    return trace.stats(True, replans, expansions_total, time.perf_counter() - t0, plan_sec, sense_sec,
+                       repairs=repairs, repair_expansions=repair_exp)
 
-def repeated_backward(world: GridWorld, tie_break: str = "larger_g") -> RunStats:
+def repeated_backward(world: GridWorld, tie_break: str = "larger_g", lean: bool = False, sample: int = 0,
+                      jps: bool = False, repair: bool = False, repair_bound: int = 1024,
+                      queue: str = "heap", probe: Optional[Probe] = None,
+                      recorder: Optional[TraceWriter] = None) -> RunStats:
+    """
+    Repeated backward A* (goal to agent); with jps, each replan uses Jump
+    Point Search instead. `repair` and `queue` work as in repeated_forward.
+    """
     kb = Knowledge(world.n)
     _init(kb, world)
-    cur = world.start
+    cells = world.cells
+    cur = world.idx(world.start)
+    goal_id = world.idx(world.goal)
 
     expansions_total = 0
     replans = 0
-    path_taken: List[Coord] = [cur]
-    expanded_all: Set[Coord] = set()
+    repairs = repair_exp = 0
+    trace = _Trace(world, lean, sample, probe, recorder)
+    engine = engine_for(world)
+    search = partial(jps_search, engine) if jps else partial(engine.search, queue=queue)
+    plan_sec = sense_sec = 0.0
+    t0 = time.perf_counter()
+
+    while cur != goal_id:
+        tp = clock()
+        res = search(goal_id, cur, kb, tie_break=tie_break)
+        dt = clock() - tp
+        plan_sec += dt
+        if probe is not None:
+            probe.on_search(res, dt, kb)
+        replans += 1
+        expansions_total += res.expansions
+        trace.expanded(res.expanded_ids)
+
+        if res.path_ids is None:
+            return trace.stats(False, replans, expansions_total, time.perf_counter() - t0, plan_sec, sense_sec,
+                               repairs=repairs, repair_expansions=repair_exp)
+
+        path = res.path_ids[::-1]
+        trace.proposed(path)
+        k = 1
+        while k < len(path):
+            step = path[k]
+            if cells[step]:
+                kb.mark_id(step, True)
+                trace.blocked(step)
+                ts = clock()
+                kb.sense(world, cur)
+                sense_sec += clock() - ts
+                if repair:
+                    tp = clock()
+                    rep = engine.detour(path, k - 1, kb, repair_bound)
+                    dt = clock() - tp
+                    plan_sec += dt
+                    if probe is not None:
+                        probe.on_search(rep, dt, kb, kind="repair")
+                    expansions_total += rep.expansions
+                    repair_exp += rep.expansions
+                    trace.expanded(rep.expanded_ids)
+                    if rep.path_ids is not None:
+                        repairs += 1
+                        path, k = rep.path_ids, 1
+                        trace.proposed(path)
+                        continue
+                break
+            cur = step
+            trace.step(cur)
+            kb.mark_id(cur, False)
+            ts = clock()
+            kb.sense(world, cur)
+            sense_sec += clock() - ts
+            if cur == goal_id:
+                break
+            k += 1
+
+    return trace.stats(True, replans, expansions_total, time.perf_counter() - t0, plan_sec, sense_sec,
+                       repairs=repairs, repair_expansions=repair_exp)
+
+def bidirectional(world: GridWorld, tie_break: str = "larger_g", lean: bool = False, sample: int = 0,
+                  probe: Optional[Probe] = None, recorder: Optional[TraceWriter] = None) -> RunStats:
+    """Repeated bidirectional A*; RunStats also carries the expansions of each direction."""
+    kb = Knowledge(world.n)
+    _init(kb, world)
+    cells = world.cells
+    cur = world.idx(world.start)
+    goal_id = world.idx(world.goal)
+
+    expansions_total = fwd_total = bwd_total = 0
+    replans = 0
+    trace = _Trace(world, lean, sample, probe, recorder)
+    fwd, bwd = engine_for(world), engine_for(world, 1)
+    plan_sec = sense_sec = 0.0
     t0 = time.perf_counter()
 
-    while cur != world.goal:
-        res = astar_once(world.goal, cur, world, kb, tie_break=tie_break)
+    while cur != goal_id:
+        tp = clock()
+        res = bidir_search(fwd, bwd, cur, goal_id, kb, tie_break=tie_break)
+        dt = clock() - tp
+        plan_sec += dt
+        if probe is not None:
+            probe.on_search(res, dt, kb)
         replans += 1
-        expansions_total += len(res.expanded)
-        expanded_all |= res.expanded
+        expansions_total += res.expansions
+        fwd_total += res.expansions_fwd
+        bwd_total += res.expansions_bwd
+        trace.expanded(res.expanded_ids)
 
-        if res.path is None:
-            return RunStats(False, len(path_taken) - 1, replans, expansions_total, time.perf_counter() - t0, path_taken, expanded_all)
+        if res.path_ids is None:
+            return trace.stats(False, replans, expansions_total, time.perf_counter() - t0, plan_sec, sense_sec,
+                               fwd_total, bwd_total)
 
-        fwd_path = list(reversed(res.path))
-        for step in fwd_path[1:]:
-            if world.is_blocked(step):
-                kb.mark(step, True)
-                kb.sense_neighbors(world, cur)
+        trace.proposed(res.path_ids)
+        for step in res.path_ids[1:]:
+            if cells[step]:
+                kb.mark_id(step, True)
+                trace.blocked(step)
+                ts = clock()
+                kb.sense(world, cur)
+                sense_sec += clock() - ts
                 break
             cur = step
-            path_taken.append(cur)
-            kb.mark(cur, False)
-            kb.sense_neighbors(world, cur)
-            if cur == world.goal:
+            trace.step(cur)
+            kb.mark_id(cur, False)
+            ts = clock()
+            kb.sense(world, cur)
+            sense_sec += clock() - ts
+            if cur == goal_id:
                 break
 
-    return RunStats(True, len(path_taken) - 1, replans, expansions_total, time.perf_counter() - t0, path_taken, expanded_all)
+    return trace.stats(True, replans, expansions_total, time.perf_counter() - t0, plan_sec, sense_sec,
+                       fwd_total, bwd_total)
 
-def adaptive_astar(world: GridWorld, tie_break: str = "larger_g") -> RunStats:
+def adaptive_astar(world: GridWorld, tie_break: str = "larger_g", lean: bool = False, sample: int = 0,
+                   persist: bool = False, queue: str = "heap", probe: Optional[Probe] = None,
+                   recorder: Optional[TraceWriter] = None, persist_dir: str = "") -> RunStats:
     kb = Knowledge(world.n)
+    epoch0 = kb.epoch      # before _init, so the walls around the start are saved too
     _init(kb, world)
-    cur = world.start
+    cells = world.cells
+    cur = world.idx(world.start)
+    goal_id = world.idx(world.goal)
 
-    # prefill Manhattan
-    h_table = [[manhattan((r, c), world.goal) for c in range(world.n)] for r in range(world.n)]
+    # learned h over Manhattan, filled lazily; with persist, shared with earlier
+    # runs on this grid together with the walls those runs discovered;
+    # persist_dir also keeps them on disk for later processes
+    if persist or persist_dir:
+        key = world.content_hash()
+        h_table = learned_heuristic(key, world.n, goal_id, persist_dir)
+        kb.mark_many(h_table.walls, True)
+    else:
+        h_table = LearnedHeuristic(world.n, goal_id)
 
     expansions_total = 0
     replans = 0
-    path_taken: List[Coord] = [cur]
-    expanded_all: Set[Coord] = set()
+    trace = _Trace(world, lean, sample, probe, recorder)
+    engine = engine_for(world)
+    plan_sec = sense_sec = 0.0
     t0 = time.perf_counter()
 
-    while cur != world.goal:
-        res = astar_once(cur, world.goal, world, kb, tie_break=tie_break, h_table=h_table)
+    while cur != goal_id:
+        tp = clock()
+        res = engine.search(cur, goal_id, kb, tie_break=tie_break, h_table=h_table, queue=queue)
+        dt = clock() - tp
+        plan_sec += dt
+        if probe is not None:
+            probe.on_search(res, dt, kb)
         replans += 1
-        expansions_total += len(res.expanded)
-        expanded_all |= res.expanded
-
-        if res.path is None:
-            return RunStats(False, len(path_taken) - 1, replans, expansions_total, time.perf_counter() - t0, path_taken, expanded_all)
-
-        # Adaptive update if we saw a goal g-value
-        if world.goal in res.gvals:
-            g_goal = res.gvals[world.goal]
-            for s in res.expanded:
-                if s in res.gvals:
-                    r, c = s
-                    h_table[r][c] = g_goal - res.gvals[s]
-
-        for step in res.path[1:]:
-            if world.is_blocked(step):
-                kb.mark(step, True)
-                kb.sense_neighbors(world, cur)
+        expansions_total += res.expansions
+        trace.expanded(res.expanded_ids)
+
+        if res.path_ids is None:
+            h_table.walls.update(kb.blocked_since(epoch0))
+            if persist_dir:
+                save_learned(h_table, learned_file(persist_dir, key, goal_id))
+            return trace.stats(False, replans, expansions_total, time.perf_counter() - t0, plan_sec, sense_sec)
+
+        # Adaptive update: the goal is the last expanded cell of a successful search
+        h_table.learn(res.expanded_ids, res.g_expanded, res.g_expanded[-1])
+
+        trace.proposed(res.path_ids)
+        for step in res.path_ids[1:]:
+            if cells[step]:
+                kb.mark_id(step, True)
+                trace.blocked(step)
+                ts = clock()
+                kb.sense(world, cur)
+                sense_sec += clock() - ts
                 break
             cur = step
-            path_taken.append(cur)
-            kb.mark(cur, False)
-            kb.sense_neighbors(world, cur)
-            if cur == world.goal:
+            trace.step(cur)
+            kb.mark_id(cur, False)
+            ts = clock()
+            kb.sense(world, cur)
+            sense_sec += clock() - ts
+            if cur == goal_id:
                 break
 
-    return RunStats(True, len(path_taken) - 1, replans, expansions_total, time.perf_counter() - t0, path_taken, expanded_all)
+    h_table.walls.update(kb.blocked_since(epoch0))
+    if persist_dir:
+        save_learned(h_table, learned_file(persist_dir, key, goal_id))
+    return trace.stats(True, replans, expansions_total, time.perf_counter() - t0, plan_sec, sense_sec)
+
+def dstar_lite(world: GridWorld, tie_break: str = "larger_g", lean: bool = False, sample: int = 0,
+               probe: Optional[Probe] = None, recorder: Optional[TraceWriter] = None) -> RunStats:
+    """
+    D* Lite: one goal-rooted search kept alive for the whole run and repaired
+    incrementally as blocked cells are discovered. `tie_break` is accepted for
+    a uniform planner signature; D* Lite's key order already fixes ties.
+    """
+    kb = Knowledge(world.n)
+    _init(kb, world)
+    cells = world.cells
+    cur = world.idx(world.start)
+    goal_id = world.idx(world.goal)
+
+    trace = _Trace(world, lean, sample, probe, recorder)
+    plan_sec = sense_sec = 0.0
+    t0 = time.perf_counter()
+    ds = DStarLite(world, kb, cur, goal_id)
+    epoch = kb.epoch
+    expanded = ds.compute()
+    dt = clock() - t0
+    plan_sec += dt
+    if probe is not None:
+        probe.on_plan(len(expanded), dt)
+    replans = 1
+    expansions_total = len(expanded)
+    trace.expanded(expanded)
+    trace.descent(ds.next_step, cur, goal_id)
+
+    while cur != goal_id:
+        nxt = ds.next_step(cur)
+        if nxt < 0:
+            return trace.stats(False, replans, expansions_total, time.perf_counter() - t0, plan_sec, sense_sec)
+
+        if cells[nxt]:
+            kb.mark_id(nxt, True)
+            trace.blocked(nxt)
+        else:
+            cur = nxt
+            trace.step(cur)
+            kb.mark_id(cur, False)
+            ts = clock()
+            kb.sense(world, cur)
+            sense_sec += clock() - ts
+
+        changed = kb.blocked_since(epoch)
+        epoch = kb.epoch
+        if changed:
+            tp = clock()
+            ds.notify_blocked(cur, changed)
+            expanded = ds.compute()
+            dt = clock() - tp
+            plan_sec += dt
+            if probe is not None:
+                probe.on_plan(len(expanded), dt)
+            replans += 1
+            expansions_total += len(expanded)
+            trace.expanded(expanded)
+            trace.descent(ds.next_step, cur, goal_id)
+
+    return trace.stats(True, replans, expansions_total, time.perf_counter() - t0, plan_sec, sense_sec)
+
+def hpa_star(world: GridWorld, tie_break: str = "larger_g", lean: bool = False, sample: int = 0,
+             cluster: int = 16, probe: Optional[Probe] = None,
+             recorder: Optional[TraceWriter] = None) -> RunStats:
+    """
+    Hierarchical planner: plans over HPAGraph's block-entrance graph, then
+    refines and walks one abstract leg at a time. Discovered walls only
+    invalidate the blocks they fall in. Paths are near-optimal, not optimal.
+    Expansions count abstract nodes plus cells visited by in-block searches;
+    `tie_break` is accepted for a uniform planner signature.
+    """
+    kb = Knowledge(world.n)
+    _init(kb, world)
+    cells = world.cells
+    cur = world.idx(world.start)
+    goal_id = world.idx(world.goal)
+
+    expansions_total = 0
+    replans = 0
+    trace = _Trace(world, lean, sample, probe, recorder)
+    graph = HPAGraph(world.n, kb, cluster)
+    graph.record = trace.keeps_ids
+    plan_sec = sense_sec = 0.0
+    t0 = time.perf_counter()
+
+    while cur != goal_id:
+        tp = clock()
+        graph.expansions, graph.expanded = 0, []
+        waypoints = graph.plan(cur, goal_id)
+        dt = clock() - tp
+        plan_sec += dt
+        if probe is not None:
+            probe.on_plan(graph.expansions, dt)
+        replans += 1
+        expansions_total += graph.expansions
+        trace.expanded(graph.expanded)
+
+        if waypoints is None:
+            return trace.stats(False, replans, expansions_total, time.perf_counter() - t0, plan_sec, sense_sec)
+
+        blocked = False
+        for wp in waypoints[1:]:
+            tp = clock()
+            graph.expansions, graph.expanded = 0, []
+            leg = graph.refine(cur, wp)
+            dt = clock() - tp
+            plan_sec += dt
+            if probe is not None:
+                probe.on_plan(graph.expansions, dt)
+            expansions_total += graph.expansions
+            trace.expanded(graph.expanded)
+            if leg is None:
+                break
+            trace.proposed(leg)
+            for step in leg[1:]:
+                if cells[step]:
+                    kb.mark_id(step, True)
+                    trace.blocked(step)
+                    ts = clock()
+                    kb.sense(world, cur)
+                    sense_sec += clock() - ts
+                    blocked = True
+                    break
+                cur = step
+                trace.step(cur)
+                kb.mark_id(cur, False)
+                ts = clock()
+                kb.sense(world, cur)
+                sense_sec += clock() - ts
+            if blocked or cur == goal_id:
+                break
+
+    return trace.stats(True, replans, expansions_total, time.perf_counter() - t0, plan_sec, sense_sec)
+
+def wavefront(world: GridWorld, tie_break: str = "larger_g", lean: bool = False, sample: int = 0,
+              probe: Optional[Probe] = None, recorder: Optional[TraceWriter] = None) -> RunStats:
+    """
+    Follows a goal-rooted distance field (Wavefront, needs numpy) downhill;
+    each batch of discovered walls is folded into the field with vectorized
+    sweeps instead of a new search. Expansions count rewritten field cells;
+    `tie_break` is accepted for a uniform planner signature.
+    """
+    kb = Knowledge(world.n)
+    _init(kb, world)
+    cells = world.cells
+    cur = world.idx(world.start)
+    goal_id = world.idx(world.goal)
+
+    trace = _Trace(world, lean, sample, probe, recorder)
+    plan_sec = sense_sec = 0.0
+    t0 = time.perf_counter()
+    wf = Wavefront(world.n, kb, goal_id)
+    wf.record = trace.keeps_ids
+    epoch = kb.epoch
+    wf.update(kb.blocked_since(0))
+    dt = clock() - t0
+    plan_sec += dt
+    if probe is not None:
+        probe.on_plan(wf.expansions, dt)
+    replans = 1
+    expansions_total = wf.expansions
+    trace.expanded(wf.expanded)
+    trace.descent(wf.next_step, cur, goal_id)
+
+    while cur != goal_id:
+        nxt = wf.next_step(cur)
+        if nxt < 0:
+            return trace.stats(False, replans, expansions_total, time.perf_counter() - t0, plan_sec, sense_sec)
+
+        if cells[nxt]:
+            kb.mark_id(nxt, True)
+            trace.blocked(nxt)
+        else:
+            cur = nxt
+            trace.step(cur)
+            kb.mark_id(cur, False)
+            ts = clock()
+            kb.sense(world, cur)
+            sense_sec += clock() - ts
+
+        changed = kb.blocked_since(epoch)
+        epoch = kb.epoch
+        if changed:
+            tp = clock()
+            wf.expansions, wf.expanded = 0, []
+            wf.update(changed)
+            dt = clock() - tp
+            plan_sec += dt
+            if probe is not None:
+                probe.on_plan(wf.expansions, dt)
+            replans += 1
+            expansions_total += wf.expansions
+            trace.expanded(wf.expanded)
+            trace.descent(wf.next_step, cur, goal_id)
+
+    return trace.stats(True, replans, expansions_total, time.perf_counter() - t0, plan_sec, sense_sec)
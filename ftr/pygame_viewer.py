@@ -2,13 +2,17 @@
 from __future__ import annotations
 import argparse
 from dataclasses import dataclass
-from typing import List, Set, Tuple
+from typing import Dict, List, Optional, Set, Tuple
 import os
+import time
 import pygame
 
 from .grid import GridWorld
+from .corpus import list_envs, load_env, load_world
 from .knowledge import Knowledge
-from .astar import astar_once
+from .astar import AStarSearch, engine_for
+from .fov import FieldOfView
+from .tracefile import TraceReader
 
 Coord = Tuple[int, int]  # (row, col)
 
@@ -31,12 +35,15 @@ def _is_cmd_ctrl_f(event):
 class Viewer:
     def __init__(self, world: GridWorld, cell_size: int = 28, fps: int = 60,
                  vision_radius: int = 6, fullscreen: bool = False, speed: float = 6.0,
-                 env_dir: str | None = None):
+                 env_dir: str | None = None, plan_ms: float = 4.0, replay: TraceReader | None = None):
         self.world = world
+        self.replay = replay     # recorded run to play back instead of planning live
         self.cell = cell_size
         self.fps = fps
         self.vision_radius = vision_radius
         self.speed_tiles_per_sec = speed
+        self.plan_ms = plan_ms   # planning budget per frame
+        self._search: AStarSearch | None = None
         self.env_dir = env_dir
         self.env_files: List[str] = []
         self.env_index = -1
@@ -82,6 +89,50 @@ class Viewer:
     def toggle_fullscreen(self) -> None:
         self.fullscreen = not self.fullscreen
         self._recreate_display()
+        self._full_redraw = True
+
+    # ----------------- cached layers -----------------
+    def _rebuild_layers(self) -> None:
+        """Pre-render walls/floor and the fog layer for the current world."""
+        n, cell = self.world.n, self.cell
+        W = n * cell
+        if self.screen.get_size() != (W, W):
+            self._recreate_display()
+        self._static = pygame.Surface((W, W))
+        self._static.fill(Colors.FLOOR)
+        cells = self.world.cells
+        for i in range(n * n):
+            if cells[i]:
+                r, c = divmod(i, n)
+                self._static.fill(Colors.WALL, pygame.Rect(c * cell, r * cell, cell, cell))
+        self._tint = pygame.Surface((cell, cell), pygame.SRCALPHA)
+        self._tint.fill((*Colors.EXPANDED, 60))
+        self._fog = pygame.Surface((W, W), pygame.SRCALPHA)
+        self._fog.fill((0, 0, 0, self.hard_alpha))
+        for i in range(n * n):
+            if cells[i]:      # unseen walls are left unfogged
+                r, c = divmod(i, n)
+                self._fog.fill((0, 0, 0, 0), pygame.Rect(c * cell, r * cell, cell, cell))
+        self._dirty: Set[Coord] = set()
+        self._drawn_cur: Coord = self.cur
+        self._drawn_path: Set[Coord] = set()
+        self._drawn_path_src: List[Coord] | None = None
+        self._drawn_expanded: Set[Coord] = set()
+        self._full_redraw = True
+
+    def _refresh_fog_cell(self, s: Coord) -> None:
+        r, c = s
+        if s in self.visible:
+            alpha = 0
+        elif s in self.seen:
+            alpha = self.soft_alpha
+        elif self.world.is_blocked(s):
+            alpha = 0
+        else:
+            alpha = self.hard_alpha
+        cell = self.cell
+        self._fog.fill((0, 0, 0, alpha), pygame.Rect(c * cell, r * cell, cell, cell))
+        self._dirty.add(s)
 
     def _recalculate_step_interval(self) -> None:
         self._step_interval = 1.0 / self.speed_tiles_per_sec
@@ -95,74 +146,116 @@ class Viewer:
         self.kb.sense_neighbors(self.world, self.cur)
         self.seen: Set[Coord] = set()
         self.visible: Set[Coord] = set()
-        self.path: List[Coord] = []
-        self.path_index = 0
+        self._set_path([])
+        self._search = None
         self.expanded_last: Set[Coord] = set()
         self._recalculate_step_interval()
+        self._fov = FieldOfView(self.world)
+        self._rebuild_layers()
         self._update_fog()
-        self._plan_from_current()
+        if self.replay is not None:
+            self._events = self.replay.events()
+        else:
+            self._plan_from_current()
 
     def _find_env_files(self) -> None:
-        if self.env_dir and os.path.isdir(self.env_dir):
-            self.env_files = sorted([f for f in os.listdir(self.env_dir) if f.endswith(".txt")])
+        if self.env_dir and os.path.exists(self.env_dir):
+            self.env_files = list_envs(self.env_dir)
 
     def _load_env_by_index(self, index: int) -> None:
         if not self.env_files or not (0 <= index < len(self.env_files)):
             return
         self.env_index = index
-        filepath = os.path.join(self.env_dir, self.env_files[self.env_index])
-        print(f"Loading: {filepath}")
-        self.world = GridWorld.load(filepath)
+        name = self.env_files[self.env_index]
+        print(f"Loading: {name} from {self.env_dir}")
+        self.world = load_env(self.env_dir, name)
+        self.replay = None
         self._reset_state()
 
-    def _plan_from_current(self) -> None:
-        res = astar_once(self.cur, self.goal, self.world, self.kb, tie_break=self.tie_break_strategy)
-        self.expanded_last = res.expanded
-        self.path = res.path or []
-        self.path_index = 0
+    def _set_path(self, path: List[Coord], index: int = 0) -> None:
+        self.path = path
+        self.path_index = index
+        self._path_at: Dict[Coord, int] = {c: k for k, c in enumerate(path)}
+
+    def _prefix_end(self) -> Optional[int]:
+        """Index of the last cell of the wall-free stretch of the path ahead; None if off the path."""
+        path = self.path
+        j = max(self.path_index - 1, 0)
+        if not path or path[j] != self.cur:
+            return None
+        blocked = self.kb.is_known_blocked
+        while j + 1 < len(path) and not blocked(path[j + 1]):
+            j += 1
+        return j
 
-    def _update_fog(self) -> None:
-        self.visible.clear()
-        radius = self.vision_radius
-        cr, cc = self.cur
+    def _plan_from_current(self) -> None:
+        """
+        Start (or restart) a search; _advance_plan runs it. While a wall-free
+        stretch of the old path lies ahead, the search starts where that
+        stretch ends, so the agent keeps walking it meanwhile.
+        """
+        w = self.world
+        self._anchor = self._prefix_end()
+        start = self.cur if self._anchor is None else self.path[self._anchor]
+        self._search = engine_for(w).begin(w.idx(start), w.idx(self.goal), self.kb,
+                                           tie_break=self.tie_break_strategy)
+
+    def _search_stale(self) -> bool:
+        # the search holds while the agent is on the prefix before its start
+        # and no new wall lands on that prefix or on a cell it generated
+        srch = self._search
+        if not srch.valid:
+            return True
+        if self._anchor is None:
+            return srch.start != self.world.idx(self.cur)
+        at = self._path_at
+        pos = self.path_index - 1
+        if pos > self._anchor or self.path[max(pos, 0)] != self.cur:
+            return True
         n = self.world.n
-        self.visible = set()
-        r2 = radius * radius
-        rmin, rmax = max(0, cr - radius), min(n - 1, cr + radius)
-        cmin, cmax = max(0, cc - radius), min(n - 1, cc + radius)
-        for r in range(rmin, rmax + 1):
-            for c in range(cmin, cmax + 1):
-                if (r - cr) * (r - cr) + (c - cc) * (c - cc) <= r2:
-                    if self._has_los((cr, cc), (r, c)):
-                        self.visible.add((r, c))
-                        self.seen.add((r, c))
-
-    def _has_los(self, a: Coord, b: Coord) -> bool:
-        (r0, c0), (r1, c1) = a, b
-        dr = abs(r1 - r0)
-        dc = abs(c1 - c0)
-        sr = 1 if r0 < r1 else -1
-        sc = 1 if c0 < c1 else -1
-        err = dr - dc
-        r, c = r0, c0
-        first = True
-        while True:
-            if not first and (r, c) != b and self.world.is_blocked((r, c)):
-                return False
-            if r == r1 and c == c1:
+        for i in self.kb.blocked_since(srch.epoch):
+            if srch.touched(i) or pos < at.get(divmod(i, n), -1) <= self._anchor:
                 return True
-            first = False
-            e2 = 2 * err
-            if e2 > -dc:
-                err -= dc; r += sr
-            if e2 < dr:
-                err += dr; c += sc
+        return False
+
+    def _advance_plan(self) -> None:
+        """Spend up to plan_ms on the pending search; splice its path on when it finishes."""
+        if self._search is None:
+            return
+        if self._search_stale():
+            self._plan_from_current()
+        srch = self._search
+        if srch.step(deadline=time.perf_counter() + self.plan_ms / 1000.0):
+            res = srch.result
+            self.expanded_last = res.expanded
+            if self._anchor is not None and res.path:
+                # the walked prefix up to the search's start, then the new path from it
+                self._set_path(self.path[:self._anchor] + res.path, self.path_index)
+            else:
+                self._set_path(res.path or [])
+            self._search = None
+
+    def _update_fog(self) -> None:
+        # only cells entering or leaving view change their fog
+        entered, left = self._fov.update(self.cur, self.vision_radius)
+        self.visible = self._fov.visible
+        self.seen |= entered
+        for s in entered:
+            self._refresh_fog_cell(s)
+        for s in left:
+            self._refresh_fog_cell(s)
 
     def _step_along_plan(self) -> None:
         if not self.path or self.path_index >= len(self.path):
-            self._plan_from_current()
+            if self._search is None:
+                self._plan_from_current()
             return
         nxt = self.path[self.path_index]
+        if self.kb.is_known_blocked(nxt):
+            # end of the still-valid prefix of an old path: wait for the pending plan
+            if self._search is None:
+                self._plan_from_current()
+            return
         if self.world.is_blocked(nxt):
             self.kb.mark(nxt, True)
             self.kb.sense_neighbors(self.world, self.cur)
@@ -171,59 +264,98 @@ class Viewer:
         self.cur = nxt
         self.path_index += 1
         self.kb.mark(self.cur, False)
+        epoch = self.kb.epoch
         self.kb.sense_neighbors(self.world, self.cur)
         self._update_fog()
+        if self._search is None:
+            # a wall found on the path ahead: replan from the end of the free
+            # stretch now instead of when the agent gets there
+            n = self.world.n
+            at = self._path_at
+            if any(at.get(divmod(i, n), -1) >= self.path_index for i in self.kb.blocked_since(epoch)):
+                self._plan_from_current()
+
+    def _replay_step(self) -> None:
+        """Apply recorded events up to and including the next move."""
+        n = self.world.n
+        for kind, value in self._events:
+            if kind == "expanded":
+                self.expanded_last = {divmod(i, n) for i in value}
+            elif kind == "path":
+                self._set_path([divmod(i, n) for i in value], 1)
+            elif kind == "blocked":
+                self.kb.mark_id(value, True)
+            elif kind == "move":
+                self.cur = divmod(value, n)
+                self.kb.mark(self.cur, False)
+                self._update_fog()
+                return
+            elif kind == "end":
+                print(f"Replay finished: reached={value}")
+        self.autopilot = False
 
     # ----------------- draw -----------------
-    def draw(self) -> None:
-        n, cell = self.world.n, self.cell
-        scr = self.screen
-        scr.fill(Colors.BG)
-
-        for r in range(n):
-            for c in range(n):
-                rect = pygame.Rect(c * cell, r * cell, cell, cell)
-                color = Colors.WALL if self.world.blocked[r][c] else Colors.FLOOR
-                scr.fill(color, rect)
-
-        for (r, c) in self.path:
+    def _draw_overlays(self, scr: pygame.Surface, path: Set[Coord], expanded: Set[Coord], area: Set[Coord] | None) -> None:
+        """Path, expanded tint, goal and player, restricted to `area` when given."""
+        cell = self.cell
+        for (r, c) in (path if area is None else path & area):
             x, y = c * cell + cell // 4, r * cell + cell // 4
             rect = pygame.Rect(x, y, cell // 2, cell // 2)
             pygame.draw.rect(scr, Colors.PATH, rect, border_radius=4)
 
-        for (r, c) in self.expanded_last:
-            rect = pygame.Rect(c * cell, r * cell, cell, cell)
-            s = pygame.Surface((cell, cell), pygame.SRCALPHA)
-            s.fill((*Colors.EXPANDED, 60))
-            scr.blit(s, rect.topleft)
-
-        gr, gc = self.goal
-        goal_rect = pygame.Rect(gc * cell + 4, gr * cell + 4, cell - 8, cell - 8)
-        pygame.draw.rect(scr, Colors.GOAL, goal_rect, border_radius=6)
-
-        pr, pc = self.cur
-        player_rect = pygame.Rect(pc * cell + 6, pr * cell + 6, cell - 12, cell - 12)
-        pygame.draw.rect(scr, Colors.PLAYER, player_rect, border_radius=8)
-
-        # Fog
-        fog_surface = pygame.Surface((n * cell, n * cell), pygame.SRCALPHA)
-        for r in range(n):
-            for c in range(n):
-                if self.world.blocked[r][c]:
-                    continue
-                if (r, c) not in self.seen:
-                    fog_surface.fill((0, 0, 0, self.hard_alpha), pygame.Rect(c * cell, r * cell, cell, cell))
-        for (r, c) in self.seen:
-            if (r, c) not in self.visible:
-                fog_surface.fill((0, 0, 0, self.soft_alpha), pygame.Rect(c * cell, r * cell, cell, cell))
-        scr.blit(fog_surface, (0, 0))
-
-        if self.show_grid:
-            for i in range(n + 1):
-                pygame.draw.line(scr, Colors.GRID, (i * cell, 0), (i * cell, n * cell))
-                pygame.draw.line(scr, Colors.GRID, (0, i * cell), (n * cell, i * cell))
-
-        pygame.display.flip()
+        for (r, c) in (expanded if area is None else expanded & area):
+            scr.blit(self._tint, (c * cell, r * cell))
+
+        if area is None or self.goal in area:
+            gr, gc = self.goal
+            goal_rect = pygame.Rect(gc * cell + 4, gr * cell + 4, cell - 8, cell - 8)
+            pygame.draw.rect(scr, Colors.GOAL, goal_rect, border_radius=6)
+
+        if area is None or self.cur in area:
+            pr, pc = self.cur
+            player_rect = pygame.Rect(pc * cell + 6, pr * cell + 6, cell - 12, cell - 12)
+            pygame.draw.rect(scr, Colors.PLAYER, player_rect, border_radius=8)
+
+    def draw(self) -> None:
+        n, cell = self.world.n, self.cell
+        scr = self.screen
+
+        # diff what is on screen against the current state
+        if self.path is not self._drawn_path_src:
+            path = set(self.path)
+            self._dirty |= path ^ self._drawn_path
+            self._drawn_path, self._drawn_path_src = path, self.path
+        if self.expanded_last is not self._drawn_expanded:
+            self._dirty |= self.expanded_last ^ self._drawn_expanded
+            self._drawn_expanded = self.expanded_last
+        if self.cur != self._drawn_cur:
+            self._dirty.add(self._drawn_cur)
+            self._dirty.add(self.cur)
+            self._drawn_cur = self.cur
+
+        # past a quarter of the grid a full blit is cheaper than per-cell work
+        if self._full_redraw or len(self._dirty) * 4 > n * n:
+            scr.blit(self._static, (0, 0))
+            self._draw_overlays(scr, self._drawn_path, self._drawn_expanded, None)
+            scr.blit(self._fog, (0, 0))
+            if self.show_grid:
+                for i in range(n + 1):
+                    pygame.draw.line(scr, Colors.GRID, (i * cell, 0), (i * cell, n * cell))
+                    pygame.draw.line(scr, Colors.GRID, (0, i * cell), (n * cell, i * cell))
+            pygame.display.flip()
+        elif self._dirty:
+            rects = [pygame.Rect(c * cell, r * cell, cell, cell) for (r, c) in self._dirty]
+            for rect in rects:
+                scr.blit(self._static, rect, rect)
+            self._draw_overlays(scr, self._drawn_path, self._drawn_expanded, self._dirty)
+            for rect in rects:
+                scr.blit(self._fog, rect, rect)
+                if self.show_grid:
+                    pygame.draw.line(scr, Colors.GRID, rect.topleft, (rect.left, rect.bottom - 1))
+                    pygame.draw.line(scr, Colors.GRID, rect.topleft, (rect.right - 1, rect.top))
+            pygame.display.update(rects)
+        self._dirty.clear()
+        self._full_redraw = False
 
     # ----------------- loop -----------------
     def run(self) -> None:
@@ -242,6 +374,7 @@ class Viewer:
                         self._reset_state()
                     elif event.key == pygame.K_g:
                         self.world = GridWorld.random(n=self.world.n, p_blocked=0.30)
+                        self.replay = None
                         self._reset_state()
                     elif event.key == pygame.K_LEFTBRACKET and self.env_files: # Previous maze '['
                         new_index = (self.env_index - 1 + len(self.env_files)) % len(self.env_files)
@@ -263,13 +396,15 @@ class Viewer:
                         self._recalculate_step_interval()
                     elif event.key == pygame.K_h:
                         self.show_grid = not self.show_grid
+                        self._full_redraw = True
                     elif (event.key == pygame.K_RETURN and (event.mod & pygame.KMOD_ALT)) or _is_cmd_ctrl_f(event):
                         self.toggle_fullscreen()
                     elif event.key == pygame.K_F11:
                         self.toggle_fullscreen()
-                    elif event.key == pygame.K_t:
+                    elif event.key == pygame.K_t and self.replay is None:
                         self.tie_break_strategy = "smaller_g" if self.tie_break_strategy == "larger_g" else "larger_g"
                         print(f"Tie-breaking strategy set to: {self.tie_break_strategy}")
+                        self._set_path(self.path[:self.path_index], self.path_index)   # replan all of it
                         self._plan_from_current()
 
             self._manual_move_timer += dt
@@ -285,7 +420,7 @@ class Viewer:
             elif keys[pygame.K_DOWN] or keys[pygame.K_s]:
                 dr = 1
 
-            if dr != 0 or dc != 0:
+            if (dr != 0 or dc != 0) and self.replay is None:
                 # If a move key is pressed and the move timer is ready
                 if self._manual_move_timer >= self._manual_move_interval:
                     nr, nc = self.cur[0] + dr, self.cur[1] + dc
@@ -294,42 +429,52 @@ class Viewer:
                         self.kb.mark(self.cur, False)
                         self.kb.sense_neighbors(self.world, self.cur)
                         self._update_fog()
+                        self._set_path([])         # old path no longer starts here
                         self._plan_from_current() # Always replan after a manual move
                         self._manual_move_timer = 0 # Reset timer after move
 
             if self.autopilot and self.cur != self.goal:
                 self._step_timer += dt
                 while self._step_timer >= self._step_interval and self.cur != self.goal:
-                    self._step_along_plan()
+                    if self.replay is not None:
+                        self._replay_step()
+                    else:
+                        self._step_along_plan()
                     self._step_timer -= self._step_interval
 
+            self._advance_plan()
             self.draw()
 
 def main():
     parser = argparse.ArgumentParser(description="Maze Runner viewer with fog-of-war")
     parser.add_argument("--n", type=int, default=31, help="Grid size when generating random maps")
     parser.add_argument("--p", type=float, default=0.30, help="Block probability for random maps")
-    parser.add_argument("--load", type=str, default=None, help="Load a saved world (.txt)")
+    parser.add_argument("--load", type=str, default=None, help="Load a saved world (.txt/.ftrb, or corpus.ftrc#name)")
     parser.add_argument("--cell", type=int, default=28, help="Cell size in pixels")
-    parser.add_argument("--envdir", type=str, default="envs", help="Directory of envs to cycle through with [ and ]")
+    parser.add_argument("--envdir", type=str, default="envs", help="Directory or corpus file of envs to cycle through with [ and ]")
     parser.add_argument("--fps", type=int, default=60, help="Frames per second")
     parser.add_argument("--vision", type=int, default=6, help="Vision radius in tiles")
     parser.add_argument("--speed", type=float, default=6.0, help="Autopilot speed in tiles/sec")
+    parser.add_argument("--plan-ms", type=float, default=4.0, help="Planning time budget per frame in ms")
+    parser.add_argument("--replay", type=str, default=None,
+                        help="Play back a trace recorded with `replanning.py trace` instead of planning live")
     parser.add_argument("--fullscreen", action="store_true", help="Start in fullscreen (toggle Option+Enter / F11)")
     args = parser.parse_args()
 
     # Determine initial world
-    if args.load:
-        world = GridWorld.load(args.load)
-    elif os.path.isdir(args.envdir) and any(f.endswith(".txt") for f in os.listdir(args.envdir)):
-        first_env = sorted([f for f in os.listdir(args.envdir) if f.endswith(".txt")])[0]
-        world = GridWorld.load(os.path.join(args.envdir, first_env))
+    replay = TraceReader(args.replay) if args.replay else None
+    if replay is not None:
+        world = replay.world
+    elif args.load:
+        world = load_world(args.load)
+    elif os.path.exists(args.envdir) and list_envs(args.envdir):
+        world = load_env(args.envdir, list_envs(args.envdir)[0])
     else:
         world = GridWorld.random(n=args.n, p_blocked=args.p)
 
     pygame.init()
     try:
-        Viewer(world, cell_size=args.cell, fps=args.fps, vision_radius=args.vision, fullscreen=args.fullscreen, speed=args.speed, env_dir=args.envdir).run()
+        Viewer(world, cell_size=args.cell, fps=args.fps, vision_radius=args.vision, fullscreen=args.fullscreen, speed=args.speed, env_dir=args.envdir, plan_ms=args.plan_ms, replay=replay).run()
     finally:
         pygame.quit()
 
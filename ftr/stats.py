@@ -0,0 +1,124 @@
+# ftr/stats.py
+from __future__ import annotations
+import math
+from typing import Dict, List, Optional, Sequence, Tuple
+
+def summarize(samples: Sequence[float]) -> Dict[str, float]:
+    """median / mean / p95 / sample std of a list of timings."""
+    xs = sorted(samples)
+    k = len(xs)
+    if k == 0:
+        return {"median": 0.0, "mean": 0.0, "p95": 0.0, "std": 0.0}
+    mean = sum(xs) / k
+    std = math.sqrt(sum((x - mean) ** 2 for x in xs) / (k - 1)) if k > 1 else 0.0
+    return {"median": _quantile(xs, 0.5), "mean": mean, "p95": _quantile(xs, 0.95), "std": std}
+
+def _quantile(xs: Sequence[float], q: float) -> float:
+    # linear interpolation between closest ranks; xs must be sorted
+    pos = (len(xs) - 1) * q
+    lo = int(math.floor(pos))
+    hi = min(lo + 1, len(xs) - 1)
+    return xs[lo] + (xs[hi] - xs[lo]) * (pos - lo)
+
+def mann_whitney_greater(a: Sequence[float], b: Sequence[float]) -> float:
+    """
+    One-sided Mann-Whitney U test, H1: values in `a` tend to be larger than
+    in `b`. Returns the p-value from the normal approximation with tie and
+    continuity correction (adequate from ~5 samples per side).
+    """
+    n1, n2 = len(a), len(b)
+    if n1 == 0 or n2 == 0:
+        return 1.0
+    pooled = sorted([(x, 0) for x in a] + [(x, 1) for x in b])
+    ranks = [0.0] * len(pooled)
+    tie_term = 0.0
+    i = 0
+    while i < len(pooled):
+        j = i
+        while j + 1 < len(pooled) and pooled[j + 1][0] == pooled[i][0]:
+            j += 1
+        r = (i + j) / 2.0 + 1.0
+        for k in range(i, j + 1):
+            ranks[k] = r
+        t = j - i + 1
+        tie_term += t ** 3 - t
+        i = j + 1
+    r1 = sum(r for r, (_, grp) in zip(ranks, pooled) if grp == 0)
+    u1 = r1 - n1 * (n1 + 1) / 2.0
+    mu = n1 * n2 / 2.0
+    nn = n1 + n2
+    var = n1 * n2 / 12.0 * ((nn + 1) - tie_term / (nn * (nn - 1))) if nn > 1 else 0.0
+    if var <= 0:
+        return 1.0
+    z = (u1 - mu - 0.5) / math.sqrt(var)
+    return 0.5 * math.erfc(z / math.sqrt(2.0))
+
+def holm(pvalues: Sequence[float], alpha: float = 0.05) -> List[bool]:
+    """
+    Holm-Bonferroni step-down: which hypotheses to reject so the chance of
+    any false rejection across the whole family stays below `alpha`.
+    """
+    m = len(pvalues)
+    reject = [False] * m
+    for rank, i in enumerate(sorted(range(m), key=lambda i: pvalues[i])):
+        if pvalues[i] >= alpha / (m - rank):
+            break
+        reject[i] = True
+    return reject
+
+# (env, alg, base_median, cur_median, p, large_enough)
+RegressionTest = Tuple[str, str, float, float, float, bool]
+
+def regression_test(
+    base: Dict,
+    cur: Dict,
+    metric: str = "time",
+    min_pct: float = 5.0,
+    min_abs: float = 0.001,
+) -> Optional[RegressionTest]:
+    """
+    Test one (env, alg) pair of bench records. `large_enough` is the effect
+    size gate: the median ratio cur/base is at least 1 + min_pct/100 and the
+    medians differ by at least `min_abs` seconds. None if either record
+    lacks `metric`.
+    """
+    if metric not in base or metric not in cur:
+        return None
+    bm, cm = base[metric]["median"], cur[metric]["median"]
+    large = bm > 0 and cm - bm >= min_abs and cm / bm >= 1.0 + min_pct / 100.0
+    p = mann_whitney_greater(cur[metric]["samples"], base[metric]["samples"])
+    return (cur["env"], cur["alg"], bm, cm, p, large)
+
+def select_regressions(tests: Sequence[RegressionTest],
+                       alpha: float = 0.05) -> List[Tuple[str, str, float, float, float]]:
+    """
+    Pairs that regress: significant under Holm-Bonferroni across all of
+    `tests` (every compared pair counts towards the family, including those
+    too small to flag) and large enough. Returns (env, alg, base_median,
+    cur_median, p).
+    """
+    reject = holm([t[4] for t in tests], alpha)
+    return [t[:5] for t, r in zip(tests, reject) if r and t[5]]
+
+def find_regressions(
+    baseline: List[Dict],
+    current: List[Dict],
+    metric: str = "time",
+    alpha: float = 0.05,
+    min_pct: float = 5.0,
+    min_abs: float = 0.001,
+) -> List[Tuple[str, str, float, float, float]]:
+    """
+    Compare bench JSON records keyed by (env, alg). A pair regresses when its
+    median got at least `min_pct` percent and `min_abs` seconds slower and
+    the slowdown is significant with the family-wise error rate over all
+    compared pairs held at `alpha`. Returns (env, alg, base_median, cur_median, p).
+    """
+    base = {(r["env"], r["alg"]): r for r in baseline}
+    tests = []
+    for r in current:
+        b = base.get((r["env"], r["alg"]))
+        t = regression_test(b, r, metric, min_pct, min_abs) if b is not None else None
+        if t is not None:
+            tests.append(t)
+    return select_regressions(tests, alpha)
@@ -0,0 +1,313 @@
+# ftr/tracefile.py
+from __future__ import annotations
+from dataclasses import dataclass
+from itertools import islice
+from typing import BinaryIO, Iterator, List, Optional, Sequence, Set, Tuple, Union
+import os
+
+from .grid import GridWorld
+from .viz import draw_world_png, flush_pngs
+
+TRACE_MAGIC = b"FTRT"
+TRACE_VERSION = 1
+
+# record tags; every record is tag, varint body length, body
+EXPANDED, PATH, PATH_IDS, MOVES, AT, BLOCKED, END = range(1, 8)
+
+_FLUSH_BYTES = 1 << 16     # write the buffer out past this size
+_MAX_MOVES = 4096          # moves held before they are written as one record
+
+def _varint(out: bytearray, v: int) -> None:
+    while v >= 0x80:
+        out.append((v & 0x7F) | 0x80)
+        v >>= 7
+    out.append(v)
+
+def _read_varint(buf: Union[bytes, memoryview], pos: int) -> Tuple[int, int]:
+    v = shift = 0
+    while True:
+        b = buf[pos]
+        pos += 1
+        v |= (b & 0x7F) << shift
+        if b < 0x80:
+            return v, pos
+        shift += 7
+
+def _steps(n: int) -> Tuple[int, int, int, int]:
+    # 2-bit direction codes: up, down, left, right
+    return (-n, n, -1, 1)
+
+def _pack_steps(out: bytearray, codes: Sequence[int]) -> None:
+    for i in range(0, len(codes), 4):
+        b = 0
+        for j, code in enumerate(codes[i:i + 4]):
+            b |= code << (2 * j)
+        out.append(b)
+
+def _unpack_steps(body: memoryview, pos: int, count: int) -> List[int]:
+    return [(body[pos + k // 4] >> (2 * (k % 4))) & 3 for k in range(count)]
+
+class TraceWriter:
+    """
+    Streams one planner run to a compact binary file, enabled by passing
+    `recorder=TraceWriter(path)` to a planner (which calls begin/end). Each
+    search adds an EXPANDED record (its cells sorted and delta-encoded as
+    varints) and a PATH record (start cell plus 2-bit up/down/left/right
+    steps); agent moves are packed the same way, and BLOCKED marks a step
+    that hit a wall. Only the current record and a 64 KiB buffer are held
+    in memory, so a trace costs no RAM beyond what the search itself used.
+    The header carries the grid, so a trace replays on its own.
+    """
+    def __init__(self, path: str, label: str = ""):
+        self.path = path
+        self.label = label
+        self._f: Optional[BinaryIO] = None
+        self._buf = bytearray()
+        self._moves: List[int] = []
+        self._n = 0
+        self._cur = 0
+        self.records = 0
+
+    def __enter__(self) -> "TraceWriter":
+        return self
+
+    def __exit__(self, *exc: object) -> None:
+        self.close()
+
+    def begin(self, world: GridWorld) -> None:
+        """Open the file and write the header; a writer records one run."""
+        if self._f is not None:
+            raise ValueError("TraceWriter already recorded a run: " + self.path)
+        d = os.path.dirname(self.path)
+        if d:
+            os.makedirs(d, exist_ok=True)
+        self._f = open(self.path, "wb")
+        self._n = world.n
+        self._cur = world.idx(world.start)
+        grid = world.to_bytes()
+        label = self.label.encode()
+        self._buf += TRACE_MAGIC
+        self._buf.append(TRACE_VERSION)
+        _varint(self._buf, len(label))
+        self._buf += label
+        _varint(self._buf, len(grid))
+        self._buf += grid
+
+    def _record(self, tag: int, body: bytes) -> None:
+        if tag != MOVES and self._moves:
+            self._flush_moves()
+        buf = self._buf
+        buf.append(tag)
+        _varint(buf, len(body))
+        buf += body
+        self.records += 1
+        if len(buf) >= _FLUSH_BYTES:
+            self._f.write(buf)
+            buf.clear()
+
+    def expanded(self, ids: Sequence[int]) -> None:
+        body = bytearray()
+        _varint(body, len(ids))
+        prev = 0
+        for i in sorted(ids):
+            _varint(body, i - prev)
+            prev = i
+        self._record(EXPANDED, body)
+
+    def proposed(self, ids: Sequence[int]) -> None:
+        """A proposed path; falls back to plain ids if it is not 4-connected."""
+        if not ids:
+            return
+        steps = _steps(self._n)
+        codes = []
+        for a, b in zip(ids, ids[1:]):
+            try:
+                codes.append(steps.index(b - a))
+            except ValueError:
+                break
+        body = bytearray()
+        _varint(body, len(ids))
+        if len(codes) == len(ids) - 1:
+            _varint(body, ids[0])
+            _pack_steps(body, codes)
+            self._record(PATH, body)
+        else:
+            for i in ids:
+                _varint(body, i)
+            self._record(PATH_IDS, body)
+
+    def move(self, cur: int) -> None:
+        delta = cur - self._cur
+        self._cur = cur
+        steps = _steps(self._n)
+        if delta not in steps:
+            body = bytearray()
+            _varint(body, cur)
+            self._record(AT, body)
+            return
+        self._moves.append(steps.index(delta))
+        if len(self._moves) >= _MAX_MOVES:
+            self._flush_moves()
+
+    def _flush_moves(self) -> None:
+        codes, self._moves = self._moves, []
+        body = bytearray()
+        _varint(body, len(codes))
+        _pack_steps(body, codes)
+        self._record(MOVES, body)
+
+    def blocked(self, cell: int) -> None:
+        body = bytearray()
+        _varint(body, cell)
+        self._record(BLOCKED, body)
+
+    def end(self, reached: bool) -> None:
+        self._record(END, bytes([int(reached)]))
+        self.close()
+
+    def close(self) -> None:
+        if self._f is None or self._f.closed:
+            return
+        if self._moves:
+            self._flush_moves()
+        self._f.write(self._buf)
+        self._buf.clear()
+        self._f.close()
+
+# ("expanded", [ids]) | ("path", [ids]) | ("move", id) | ("blocked", id) | ("end", reached)
+TraceEvent = Tuple[str, object]
+
+class TraceReader:
+    """Reads a TraceWriter file record by record; `world` and `label` come from the header."""
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, "rb") as f:
+            head = f.read(len(TRACE_MAGIC) + 1)
+            if head[:len(TRACE_MAGIC)] != TRACE_MAGIC:
+                raise ValueError("not a trace file: " + path)
+            if head[-1] != TRACE_VERSION:
+                raise ValueError(f"unsupported trace version {head[-1]}: {path}")
+            label = f.read(self._varint(f))
+            self.label = label.decode()
+            self.world = GridWorld.from_bytes(f.read(self._varint(f)))
+            self._data_start = f.tell()
+
+    @staticmethod
+    def _varint(f: BinaryIO) -> int:
+        v = shift = 0
+        while True:
+            b = f.read(1)
+            if not b:
+                raise ValueError("truncated trace")
+            v |= (b[0] & 0x7F) << shift
+            if b[0] < 0x80:
+                return v
+            shift += 7
+
+    def events(self) -> Iterator[TraceEvent]:
+        """Decoded events in run order; a file cut short just ends early."""
+        n = self.world.n
+        steps = _steps(n)
+        cur = self.world.idx(self.world.start)
+        with open(self.path, "rb") as f:
+            f.seek(self._data_start)
+            while True:
+                tag = f.read(1)
+                if not tag:
+                    return
+                try:
+                    size = self._varint(f)
+                except ValueError:
+                    return
+                body = memoryview(f.read(size))
+                if len(body) < size:
+                    return
+                kind = tag[0]
+                if kind == EXPANDED:
+                    count, pos = _read_varint(body, 0)
+                    ids, prev = [], 0
+                    for _ in range(count):
+                        d, pos = _read_varint(body, pos)
+                        prev += d
+                        ids.append(prev)
+                    yield "expanded", ids
+                elif kind == PATH:
+                    count, pos = _read_varint(body, 0)
+                    s, pos = _read_varint(body, pos)
+                    ids = [s]
+                    for code in _unpack_steps(body, pos, count - 1):
+                        s += steps[code]
+                        ids.append(s)
+                    yield "path", ids
+                elif kind == PATH_IDS:
+                    count, pos = _read_varint(body, 0)
+                    ids = []
+                    for _ in range(count):
+                        i, pos = _read_varint(body, pos)
+                        ids.append(i)
+                    yield "path", ids
+                elif kind == MOVES:
+                    count, pos = _read_varint(body, 0)
+                    for code in _unpack_steps(body, pos, count):
+                        cur += steps[code]
+                        yield "move", cur
+                elif kind == AT:
+                    cur = _read_varint(body, 0)[0]
+                    yield "move", cur
+                elif kind == BLOCKED:
+                    yield "blocked", _read_varint(body, 0)[0]
+                elif kind == END:
+                    yield "end", bool(body[0])
+                # unknown tags are skipped, so newer writers stay readable
+
+@dataclass
+class Frame:
+    index: int
+    agent: int             # cell the agent stood on when the path was proposed
+    path: List[int]        # proposed path (empty when the search failed)
+    expanded: Set[int]     # cells expanded since the previous frame
+    trail: List[int]       # cells visited, start first; shared by all frames and still growing
+    steps: int             # this frame's trail is trail[:steps]
+    reached: Optional[bool] = None   # set on the last frame of a finished run
+
+def frames(reader: TraceReader) -> Iterator[Frame]:
+    """
+    One Frame per proposed path, plus a closing frame for the end of the run.
+    Frames share one trail list, which only grows, and record its length,
+    so a frame costs O(1) however long the run; frame.trail[:frame.steps]
+    is that frame's trail at any later time.
+    """
+    w = reader.world
+    cur = w.idx(w.start)
+    trail = [cur]
+    expanded: Set[int] = set()
+    k = 0
+    for kind, value in reader.events():
+        if kind == "expanded":
+            expanded.update(value)
+        elif kind == "path":
+            yield Frame(k, cur, value, expanded, trail, len(trail))
+            expanded = set()
+            k += 1
+        elif kind == "move":
+            cur = value
+            trail.append(cur)
+        elif kind == "end":
+            yield Frame(k, cur, [], expanded, trail, len(trail), value)
+            return
+
+def render_trace(path: str, out_dir: str, cell: int = 10, every: int = 1) -> int:
+    """Draw every `every`-th frame (and the last) of a trace as PNGs; returns how many."""
+    reader = TraceReader(path)
+    w = reader.world
+    n = w.n
+    written = 0
+    for fr in frames(reader):
+        if fr.index % every and fr.reached is None:
+            continue
+        draw_world_png(w, [divmod(i, n) for i in fr.path], {divmod(i, n) for i in fr.expanded},
+                       os.path.join(out_dir, f"frame_{fr.index:05d}.png"), cell,
+                       trail=[divmod(i, n) for i in islice(fr.trail, fr.steps)])
+        written += 1
+    flush_pngs()
+    return written
@@ -1,7 +1,8 @@
 # ftr/viz.py
 from __future__ import annotations
-import os
-from typing import List, Optional, Set
+import math, os
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, List, Optional, Sequence, Set, Tuple
 try:
     from PIL import Image, ImageDraw
     PIL_AVAILABLE = True
@@ -11,49 +12,148 @@ except Exception:
 from .types import Coord
 from .grid import GridWorld
 
+# palette indices; cell values 0/1 of GridWorld.cells map straight onto FREE/WALL
+FREE, WALL, EXPANDED, PATH, START, GOAL, TRAIL = range(7)
+PALETTE = [
+    240, 240, 240,   # free
+    0, 0, 0,         # wall
+    255, 200, 200,   # expanded
+    160, 190, 255,   # path
+    100, 220, 120,   # start
+    255, 170, 80,    # goal
+    70, 90, 200,     # trail (trace replay: cells already walked)
+]
+
+# optional background writers: encoding + disk I/O off the caller's thread
+_png_pool: Optional[ThreadPoolExecutor] = None
+_png_pending: List[Future] = []
+
+def set_png_workers(workers: int) -> None:
+    """Use `workers` threads to encode/write PNGs (0 = write synchronously)."""
+    global _png_pool
+    flush_pngs()
+    if _png_pool is not None:
+        _png_pool.shutdown()
+        _png_pool = None
+    if workers > 0:
+        _png_pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="png")
+
+def flush_pngs() -> None:
+    """Block until queued PNGs are written; re-raises the first write error."""
+    global _png_pending
+    pending, _png_pending = _png_pending, []
+    for fut in pending:
+        fut.result()
+
+def _save(img: "Image.Image", out_png: str) -> None:
+    os.makedirs(os.path.dirname(out_png), exist_ok=True)
+    img.save(out_png)
+
 def draw_world_png(world: GridWorld,
                    path: Optional[List[Coord]],
                    expanded: Optional[Set[Coord]],
                    out_png: str,
-                   cell: int = 10) -> None:
+                   cell: int = 10,
+                   trail: Optional[List[Coord]] = None) -> None:
     if not PIL_AVAILABLE:
         print("Pillow not installed; skipping PNG:", out_png)
         return
 
     n = world.n
-    W = n * cell
-    img = Image.new("RGB", (W, W), (255, 255, 255))
-    drw = ImageDraw.Draw(img)
-
-    # base grid
-    for r in range(n):
-        for c in range(n):
-            x0, y0 = c * cell, r * cell
-            x1, y1 = x0 + cell, y0 + cell
-            if world.blocked[r][c]:
-                drw.rectangle((x0, y0, x1, y1), fill=(0, 0, 0))
-            else:
-                drw.rectangle((x0, y0, x1, y1), fill=(240, 240, 240))
-
-    # expanded cells
+    # one palette index per cell: walls/floor straight from the cell buffer,
+    # then expanded, path, trail and start/goal written over it
+    buf = bytearray(world.cells)
     if expanded:
         for (r, c) in expanded:
-            x0, y0 = c * cell, r * cell
-            x1, y1 = x0 + cell, y0 + cell
-            drw.rectangle((x0, y0, x1, y1), fill=(255, 200, 200))
-
-    # path
+            buf[r * n + c] = EXPANDED
     if path and len(path) > 1:
         for (r, c) in path:
-            x0, y0 = c * cell, r * cell
-            x1, y1 = x0 + cell, y0 + cell
-            drw.rectangle((x0, y0, x1, y1), fill=(160, 190, 255))
-
-    # start/goal
+            buf[r * n + c] = PATH
+    if trail:
+        for (r, c) in trail:
+            buf[r * n + c] = TRAIL
     sr, sc = world.start
     gr, gc = world.goal
-    drw.rectangle((sc*cell, sr*cell, sc*cell+cell, sr*cell+cell), fill=(100, 220, 120))
-    drw.rectangle((gc*cell, gr*cell, gc*cell+cell, gr*cell+cell), fill=(255, 170, 80))
+    buf[sr * n + sc] = START
+    buf[gr * n + gc] = GOAL
 
-    os.makedirs(os.path.dirname(out_png), exist_ok=True)
+    img = Image.frombytes("P", (n, n), bytes(buf))
+    img.putpalette(PALETTE)
+    if cell != 1:
+        img = img.resize((n * cell, n * cell), Image.NEAREST)
+
+    if _png_pool is not None:
+        _png_pending.append(_png_pool.submit(_save, img, out_png))
+    else:
+        _save(img, out_png)
+
+
+# line colors for plot_loglog, cycled per series
+SERIES_COLORS = [
+    (31, 119, 180), (255, 127, 14), (44, 160, 44), (214, 39, 40), (148, 103, 189),
+    (140, 86, 75), (227, 119, 194), (127, 127, 127), (188, 189, 34), (23, 190, 207),
+]
+
+def _decades(lo: float, hi: float) -> Tuple[float, float]:
+    # log10 axis range padded out to whole decades (at least one)
+    a, b = math.floor(math.log10(lo)), math.ceil(math.log10(hi))
+    return a, max(b, a + 1)
+
+def plot_loglog(series: Dict[str, Sequence[Tuple[float, float]]],
+                out_png: str,
+                xlabel: str,
+                ylabel: str,
+                size: Tuple[int, int] = (720, 480)) -> bool:
+    """
+    Line plot of (x, y) points per named series on log-log axes, with decade
+    grid lines and a legend. Points with x or y <= 0 are dropped. Returns
+    False (and writes nothing) without Pillow or without plottable points.
+    """
+    if not PIL_AVAILABLE:
+        print("Pillow not installed; skipping plot:", out_png)
+        return False
+    pts = {name: sorted((x, y) for x, y in xy if x > 0 and y > 0) for name, xy in series.items()}
+    pts = {name: xy for name, xy in pts.items() if xy}
+    if not pts:
+        return False
+    xs = [x for xy in pts.values() for x, _ in xy]
+    ys = [y for xy in pts.values() for _, y in xy]
+    x0, x1 = _decades(min(xs), max(xs))
+    y0, y1 = _decades(min(ys), max(ys))
+
+    W, H = size
+    left, right, top, bottom = 64, 180, 20, 44
+    pw, ph = W - left - right, H - top - bottom
+
+    def px(x: float, y: float) -> Tuple[float, float]:
+        return (left + (math.log10(x) - x0) / (x1 - x0) * pw,
+                top + ph - (math.log10(y) - y0) / (y1 - y0) * ph)
+
+    img = Image.new("RGB", size, (255, 255, 255))
+    d = ImageDraw.Draw(img)
+    for e in range(int(x0), int(x1) + 1):
+        x = left + (e - x0) / (x1 - x0) * pw
+        d.line([(x, top), (x, top + ph)], fill=(225, 225, 225))
+        d.text((x - 10, top + ph + 4), f"1e{e}", fill=(0, 0, 0))
+    for e in range(int(y0), int(y1) + 1):
+        y = top + ph - (e - y0) / (y1 - y0) * ph
+        d.line([(left, y), (left + pw, y)], fill=(225, 225, 225))
+        d.text((4, y - 6), f"1e{e}", fill=(0, 0, 0))
+    d.rectangle([left, top, left + pw, top + ph], outline=(0, 0, 0))
+    d.text((left + pw // 2 - 30, H - 18), xlabel, fill=(0, 0, 0))
+    d.text((4, 4), ylabel, fill=(0, 0, 0))
+
+    for k, (name, xy) in enumerate(pts.items()):
+        color = SERIES_COLORS[k % len(SERIES_COLORS)]
+        line = [px(x, y) for x, y in xy]
+        if len(line) > 1:
+            d.line(line, fill=color, width=2)
+        for x, y in line:
+            d.ellipse([x - 3, y - 3, x + 3, y + 3], fill=color)
+        ly = top + 4 + 14 * k
+        d.line([(left + pw + 10, ly + 6), (left + pw + 26, ly + 6)], fill=color, width=2)
+        d.text((left + pw + 30, ly), name, fill=(0, 0, 0))
+
+    os.makedirs(os.path.dirname(out_png) or ".", exist_ok=True)
     img.save(out_png)
+    return True
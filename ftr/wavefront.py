@@ -0,0 +1,120 @@
+# ftr/wavefront.py
+from __future__ import annotations
+from typing import Iterable, List, Tuple
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except Exception:
+    NUMPY_AVAILABLE = False
+
+from .knowledge import Knowledge
+
+INF = 1 << 30      # fits int32 with room for +1
+
+class Wavefront:
+    """
+    Goal-rooted distance field over the agent's optimistic map (unknown cells
+    free), held as an (n+2) x (n+2) int32 NumPy array with an INF border.
+
+    The field starts as the Manhattan distance to the goal, which is exact on
+    an empty grid, and every batch of newly blocked cells is folded in by two
+    vectorized sweeps restricted to a growing window around the change:
+    `raise` drops cells that lost every neighbor one step closer to the goal
+    (what survives is still exact), then `lower` relaxes
+    d = min(d, min(neighbors) + 1) over free cells until nothing changes.
+    Distances only grow when cells get blocked, so this reaches the exact
+    field of the new map. `expansions` counts the cells rewritten; the cell
+    ids themselves are kept in `expanded` only if `record`.
+    """
+    def __init__(self, n: int, kb: Knowledge, goal: int):
+        if not NUMPY_AVAILABLE:
+            raise ImportError("the wavefront planner needs numpy")
+        self.n = n
+        self.kb = kb
+        self.goal = goal
+        gr, gc = divmod(goal, n)
+        ar = np.arange(n, dtype=np.int32)
+        self.D = np.full((n + 2, n + 2), INF, dtype=np.int32)
+        self.D[1:-1, 1:-1] = np.abs(ar - gr)[:, None] + np.abs(ar - gc)[None, :]
+        # free mask, padded: built from kb once, then updated cell by cell
+        self.F = np.zeros((n + 2, n + 2), dtype=bool)
+        self.F[1:-1, 1:-1] = np.frombuffer(kb.blocked, dtype=np.uint8).reshape(n, n) == 0
+        self.expansions = 0
+        self.record = True
+        self.expanded: List[int] = []
+
+    def dist(self, i: int) -> int:
+        r, c = divmod(i, self.n)
+        return int(self.D[r + 1, c + 1])
+
+    def _nbmin(self, r0: int, r1: int, c0: int, c1: int) -> "np.ndarray":
+        D = self.D
+        return np.minimum(np.minimum(D[r0 - 1:r1 - 1, c0:c1], D[r0 + 1:r1 + 1, c0:c1]),
+                          np.minimum(D[r0:r1, c0 - 1:c1 - 1], D[r0:r1, c0 + 1:c1 + 1]))
+
+    def _grow(self, mask: "np.ndarray", r0: int, c0: int) -> Tuple[int, int, int, int]:
+        # bounding box (padded coords) of mask's true cells, one cell wider, clipped to the interior
+        rows = np.flatnonzero(mask.any(axis=1))
+        cols = np.flatnonzero(mask.any(axis=0))
+        n = self.n
+        return (max(1, r0 + int(rows[0]) - 1), min(n + 1, r0 + int(rows[-1]) + 2),
+                max(1, c0 + int(cols[0]) - 1), min(n + 1, c0 + int(cols[-1]) + 2))
+
+    def _touched(self, mask: "np.ndarray", r0: int, c0: int) -> None:
+        k = int(np.count_nonzero(mask))
+        self.expansions += k
+        if self.record and k:
+            rr, cc = np.nonzero(mask)
+            self.expanded.extend(((rr + r0 - 1) * self.n + cc + c0 - 1).tolist())
+
+    def update(self, blocked: Iterable[int]) -> None:
+        """Fold cells newly marked blocked in kb into the field."""
+        n, D = self.n, self.D
+        ids = np.fromiter(blocked, dtype=np.int64)
+        if ids.size == 0:
+            return
+        rs, cs = ids // n + 1, ids % n + 1
+        D[rs, cs] = INF
+        self.F[rs, cs] = False
+        lo = (max(1, int(rs.min()) - 1), min(n + 1, int(rs.max()) + 2),
+              max(1, int(cs.min()) - 1), min(n + 1, int(cs.max()) + 2))
+
+        # raise: invalidate cells with no neighbor at d - 1
+        box = lo
+        while True:
+            r0, r1, c0, c1 = box
+            sub = D[r0:r1, c0:c1]
+            lost = (sub > 0) & (sub < INF) & (self._nbmin(r0, r1, c0, c1) >= sub)
+            if not lost.any():
+                break
+            sub[lost] = INF
+            self._touched(lost, r0, c0)
+            box = self._grow(lost, r0, c0)
+            lo = (min(lo[0], box[0]), max(lo[1], box[1]), min(lo[2], box[2]), max(lo[3], box[3]))
+
+        # lower: relax the invalidated region from its exact surroundings
+        box = lo
+        while True:
+            r0, r1, c0, c1 = box
+            sub = D[r0:r1, c0:c1]
+            cand = self._nbmin(r0, r1, c0, c1) + 1
+            better = self.F[r0:r1, c0:c1] & (cand < sub)
+            if not better.any():
+                break
+            sub[better] = cand[better]
+            self._touched(better, r0, c0)
+            box = self._grow(better, r0, c0)
+
+    def next_step(self, cur: int) -> int:
+        """Neighbor of cur one step closer to the goal (up/down/left/right order on ties), or -1."""
+        n, D = self.n, self.D
+        r, c = divmod(cur, n)
+        r, c = r + 1, c + 1
+        if D[r, c] >= INF:
+            return -1
+        best, bd = -1, INF
+        for dr, dc in ((-1, 0), (1, 0), (0, -1), (0, 1)):
+            d = D[r + dr, c + dc]
+            if d < bd:
+                best, bd = (r + dr - 1) * n + c + dc - 1, d
+        return best